@@ -1,6 +1,5 @@
 
 
-import base64
 import requests
 from pathlib import Path
 from io import BytesIO
@@ -28,14 +27,16 @@ while True:
     response = requests.post(
         "http://127.0.0.1:5000/convert-to-pdf",
         files={'file': (filename, file_obj)},
+        # Ask for the raw PDF, without this the PDF is sent base64 encoded in JSON
+        headers={'Accept': 'application/pdf'},
+        stream=True,
     )
 
     if response.status_code == 200:
-        json_data = response.json()
-        pdf_content = json_data['pdfcontent']
         result_path = test_dir / "converted_document.pdf"
         with open(result_path, "wb") as f:
-            f.write(base64.b64decode(pdf_content))
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                f.write(chunk)
         print(f"Document converted and saved to {result_path}")
     else:
         print(f"Server returned error {response.status_code}")
\ No newline at end of file
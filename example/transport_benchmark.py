@@ -0,0 +1,100 @@
+"""Compares the UNO socket and pipe transports
+
+Starts one LibreOffice per transport and measures the latency of a trivial
+round trip call, and the throughput of sending payloads from 1kb to 100mb to
+LibreOffice and reading them back, the way documents are sent for conversion.
+
+    python transport_benchmark.py --sizes 1024 1048576 --rounds 20
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import uno
+
+from unoserver.libreoffice_uno_server import UnoServer
+
+DEFAULT_SIZES = [1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2]
+
+
+def measure_latency(converter, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        converter.ping()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_transfer(converter, payload, rounds):
+    upload, download = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        stream = converter.service.createInstanceWithArgumentsAndContext(
+            "com.sun.star.io.SequenceInputStream", (uno.ByteSequence(payload),), converter.context
+        )
+        upload.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        read, data = stream.readBytes(None, len(payload))
+        download.append(time.perf_counter() - start)
+        stream.closeInput()
+        assert read == len(payload)
+    return upload, download
+
+
+def human_size(size):
+    for unit in ("b", "kb", "mb"):
+        if size < 1024 or unit == "mb":
+            return f"{size:g}{unit}"
+        size /= 1024
+
+
+def run(transport, port, sizes, rounds, executable):
+    with tempfile.TemporaryDirectory(prefix=f"unoserver-benchmark-{transport}-") as profile_dir:
+        server = UnoServer(
+            uno_port=str(port),
+            user_installation=Path(profile_dir).as_uri(),
+            install_signal_handlers=False,
+            probe_interval=0,
+            uno_transport=transport,
+        )
+        server.start(executable)
+        try:
+            converter = server.converter_instance
+            latency = measure_latency(converter, rounds * 10)
+            print(
+                f"{transport:>6} latency: median {statistics.median(latency) * 1e6:.0f}us, "
+                f"max {max(latency) * 1e6:.0f}us"
+            )
+            for size in sizes:
+                payload = bytes(size)
+                # Fewer rounds for the large payloads, they take long enough
+                size_rounds = max(1, rounds * 1024 ** 2 // max(size, 1024 ** 2))
+                upload, download = measure_transfer(converter, payload, size_rounds)
+                print(
+                    f"{transport:>6} {human_size(size):>6}: "
+                    f"send {size / statistics.median(upload) / 1024 ** 2:8.1f}mb/s, "
+                    f"receive {size / statistics.median(download) / 1024 ** 2:8.1f}mb/s"
+                )
+        finally:
+            server.intentional_exit = True
+            server.kill_libreoffice()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Payload sizes in bytes")
+    parser.add_argument("--rounds", type=int, default=10, help="Rounds per payload of up to 1mb")
+    parser.add_argument("--port", type=int, default=2102, help="The port for the socket transport")
+    parser.add_argument("--executable", default="libreoffice")
+    args = parser.parse_args()
+
+    for transport in ("socket", "pipe"):
+        run(transport, args.port, args.sizes, args.rounds, args.executable)
+
+
+if __name__ == "__main__":
+    main()
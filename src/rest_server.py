@@ -1,12 +1,31 @@
+import json
 import logging
+import mimetypes
 import os
+import signal
 import tempfile
-from pathlib import Path
+import threading
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from werkzeug.wsgi import ClosingIterator
 import base64
 
-from unoserver.libreoffice_uno_server import UnoServer
+from unoserver import batch, metrics
+from unoserver.admission import AdmissionQueue
+from unoserver.cache import ConversionCache
+from unoserver.containment import ResourceLimits
+from unoserver.drain import Drainer
+from unoserver.exceptions import (
+    ConversionTimeoutException,
+    LibreOfficeCrashedException,
+    QueueFullException,
+    QueueTimeoutException,
+)
+from unoserver.jobs import DONE, QUEUED, RUNNING, JobManager
+from unoserver.pool import UnoServerPool
+from unoserver.recycling import RecyclePolicy
+from unoserver.routing import DocumentRouter, WorkerGroup
+from unoserver.service import ConversionService
 
 logger = logging.getLogger("unoserver")
 
@@ -16,22 +35,388 @@ logger.setLevel(logging.DEBUG)
 LISTEN_INTERFACE = os.environ.get('LISTEN_INTERFACE', '0.0.0.0')
 LISTEN_PORT = int(os.environ.get('LISTEN_PORT', '5000'))
 CONVERSION_TIMEOUT = int(os.environ.get('CONVERSION_TIMEOUT', '30'))
+# Clients can ask for another deadline with the X-Conversion-Timeout header, up to this
+MAX_CONVERSION_TIMEOUT = int(os.environ.get('MAX_CONVERSION_TIMEOUT', str(CONVERSION_TIMEOUT * 10)))
 MEMORY_USAGE_RATIO_LIMIT = float(os.environ.get('MEMORY_USAGE_RATIO_LIMIT', '8.0'))
+POOL_SIZE = int(os.environ.get('POOL_SIZE', os.cpu_count() or 1))
+UNO_PORT_BASE = int(os.environ.get('UNO_PORT_BASE', '2002'))
+# "socket" connects to LibreOffice over loopback TCP, "pipe" over a named pipe
+UNO_TRANSPORT = os.environ.get('UNO_TRANSPORT', 'socket')
+# Keep an extra LibreOffice started, to take over from a worker that gets recycled
+STANDBY_WORKER = os.environ.get('STANDBY_WORKER', 'true').lower() in ('1', 'true', 'yes')
+# Route documents by class (text, spreadsheet, presentation, drawing) to their own groups of
+# workers, as JSON, ie {"spreadsheet": {"size": 2, "memory_usage_ratio_limit": 12,
+# "conversion_timeout": 120, "max_queue_size": 8}}. Other documents go to the default group
+# of POOL_SIZE workers. Every group gets WORKER_GROUP_PORT_STRIDE ports from UNO_PORT_BASE up.
+WORKER_GROUPS = json.loads(os.environ.get('WORKER_GROUPS') or '{}')
+WORKER_GROUP_PORT_STRIDE = int(os.environ.get('WORKER_GROUP_PORT_STRIDE', '100'))
+# Hard limits for every LibreOffice: the memory and CPUs of a cgroup of its own, where the
+# cgroup is writable, and an address space limit, leave them empty for no limit
+LIBREOFFICE_MEMORY_LIMIT = int(os.environ.get('LIBREOFFICE_MEMORY_LIMIT') or 0) or None
+LIBREOFFICE_CPU_LIMIT = float(os.environ.get('LIBREOFFICE_CPU_LIMIT') or 0) or None
+LIBREOFFICE_ADDRESS_SPACE_LIMIT = int(os.environ.get('LIBREOFFICE_ADDRESS_SPACE_LIMIT') or 0) or None
+# Proactive recycling, leave these empty to only recycle at the memory limit
+RECYCLE_AFTER_CONVERSIONS = int(os.environ.get('RECYCLE_AFTER_CONVERSIONS') or 0) or None
+RECYCLE_AFTER_INPUT_BYTES = int(os.environ.get('RECYCLE_AFTER_INPUT_BYTES') or 0) or None
+RECYCLE_MEMORY_TREND_HORIZON = float(os.environ.get('RECYCLE_MEMORY_TREND_HORIZON') or 0) or None
+RECYCLE_IDLE_AFTER = float(os.environ.get('RECYCLE_IDLE_AFTER') or 0) or None
+RECYCLE_IDLE_THRESHOLD = float(os.environ.get('RECYCLE_IDLE_THRESHOLD', '0.8'))
+# How often the UNO bridge of every LibreOffice is probed, and how long it may take to answer
+PROBE_INTERVAL = float(os.environ.get('PROBE_INTERVAL', '1.0'))
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', '0.5'))
+# Convert a sample of every document type before a LibreOffice takes traffic
+WARMUP = os.environ.get('WARMUP', 'true').lower() in ('1', 'true', 'yes')
+# An initialised LibreOffice profile that new instances are copied from
+PROFILE_TEMPLATE_DIR = os.environ.get(
+    'PROFILE_TEMPLATE_DIR', os.path.join(tempfile.gettempdir(), 'unoserver-profile-template')
+)
+# The index of the LibreOffice filters and types is saved here, once per LibreOffice version
+FILTER_CATALOG_DIR = os.environ.get(
+    'FILTER_CATALOG_DIR', os.path.join(tempfile.gettempdir(), 'unoserver-filter-catalog')
+)
+# "development" runs the Flask development server, "production" runs waitress
+SERVER_MODE = os.environ.get('SERVER_MODE', 'development')
+MAX_QUEUE_SIZE = int(os.environ.get('MAX_QUEUE_SIZE', str(POOL_SIZE * 4)))
+MAX_QUEUE_WAIT = float(os.environ.get('MAX_QUEUE_WAIT', '60'))
+# The default group, and the groups of WORKER_GROUPS
+WORKER_GROUP_SETTINGS = {
+    'default': {'classes': [], 'size': POOL_SIZE, 'max_queue_size': MAX_QUEUE_SIZE},
+    **WORKER_GROUPS,
+}
+# Every worker and queue slot of every group can hold a thread, leave some threads
+# free for health checks when all of them are taken
+CONVERSION_SLOTS = sum(
+    int(settings.get('size', 1)) + int(settings.get('max_queue_size', int(settings.get('size', 1)) * 4))
+    for settings in WORKER_GROUP_SETTINGS.values()
+)
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', str(CONVERSION_SLOTS + 4)))
+# Conversion result cache, set CACHE_MEMORY_BYTES to 0 to disable it
+CACHE_MEMORY_BYTES = int(os.environ.get('CACHE_MEMORY_BYTES', str(256 * 1024 ** 2)))
+CACHE_DISK_BYTES = int(os.environ.get('CACHE_DISK_BYTES', '0'))
+CACHE_DIR = os.environ.get('CACHE_DIR')
+# Collapse identical concurrent conversions into one LibreOffice job
+COALESCE_REQUESTS = os.environ.get('COALESCE_REQUESTS', 'true').lower() in ('1', 'true', 'yes')
+# How many documents of one batch are converted at the same time
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', str(POOL_SIZE)))
+# How many outputs one /convert-multi request may ask for
+MAX_CONVERSION_TARGETS = int(os.environ.get('MAX_CONVERSION_TARGETS', '10'))
+# Asynchronous jobs, their inputs and outputs are spooled to JOB_SPOOL_DIR
+JOB_SPOOL_DIR = os.environ.get('JOB_SPOOL_DIR')
+JOB_TTL = int(os.environ.get('JOB_TTL', '3600'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', str(POOL_SIZE)))
+# More waiting jobs than this are rejected with a 429
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', str(JOB_WORKERS * 50)))
+# A job that can't get into the conversion queue for this many seconds fails
+JOB_MAX_QUEUE_WAIT = float(os.environ.get('JOB_MAX_QUEUE_WAIT', '3600'))
+RESPONSE_CHUNK_SIZE = int(os.environ.get('RESPONSE_CHUNK_SIZE', str(256 * 1024)))
+# Converted documents larger than this are spooled to a temporary file in OUTPUT_SPOOL_DIR
+OUTPUT_SPOOL_THRESHOLD = int(os.environ.get('OUTPUT_SPOOL_THRESHOLD', str(8 * 1024 ** 2)))
+OUTPUT_SPOOL_DIR = os.environ.get('OUTPUT_SPOOL_DIR')
+# On SIGTERM, new requests are refused and accepted ones get this long to finish
+DRAIN_GRACE_PERIOD = float(os.environ.get('DRAIN_GRACE_PERIOD', '30'))
+
+
+class RequestTracker:
+    """WSGI middleware that counts the requests in progress, until their response is sent"""
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def _change(self, amount):
+        with self._lock:
+            self.active += amount
+
+    def __call__(self, environ, start_response):
+        self._change(1)
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._change(-1)
+            raise
+        return ClosingIterator(response, lambda: self._change(-1))
+
+
+def wants_raw_response():
+    """Content negotiation: raw bytes for `Accept: application/pdf` or `?format=raw`
+
+    Anything else, including no Accept header at all, gets the base64 JSON
+    envelope that the old clients expect.
+    """
+    if request.args.get('format') in ('raw', 'binary', 'pdf'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/pdf'])
+    return best == 'application/pdf'
+
+
+def requested_timeout():
+    """The conversion deadline a client asked for in the X-Conversion-Timeout header"""
+    value = request.headers.get('X-Conversion-Timeout')
+    if not value:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    if timeout <= 0:
+        return None
+    return min(timeout, MAX_CONVERSION_TIMEOUT)
+
+
+def requested_update_index():
+    """Whether a client wants the indexes and fields refreshed, the `update_index` form
+    field or query parameter. Documents without any skip it either way.
+    """
+    value = request.values.get('update_index')
+    if value is None:
+        return True
+    return value.strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def requested_targets():
+    """The targets of a /convert-multi request, from the `targets` form field
+
+    It's a JSON list of formats, ie ["pdf", "txt"], or of objects with a
+    `convert_to` and optionally a `filtername` and `filter_options`, ie
+    {"convert_to": "png", "filter_options": ["PixelWidth=800"]}.
+    Raises ValueError if it can't be used.
+    """
+    try:
+        targets = json.loads(request.form.get('targets') or '[]')
+    except ValueError:
+        raise ValueError('The targets are not valid JSON')
+    if not isinstance(targets, list) or not targets:
+        raise ValueError('The targets must be a list of at least one format')
+    if len(targets) > MAX_CONVERSION_TARGETS:
+        raise ValueError(f'At most {MAX_CONVERSION_TARGETS} targets can be converted at once')
+
+    parsed = []
+    for target in targets:
+        if isinstance(target, str):
+            target = {'convert_to': target}
+        if not isinstance(target, dict) or not isinstance(target.get('convert_to'), str):
+            raise ValueError(f'Every target needs a convert_to format, not {json.dumps(target)}')
+        filter_options = target.get('filter_options', [])
+        if not isinstance(filter_options, list) or not all(isinstance(o, str) for o in filter_options):
+            raise ValueError('The filter_options of a target must be a list of strings')
+        parsed.append(
+            {
+                'convert_to': target['convert_to'],
+                'filtername': target.get('filtername'),
+                'filter_options': filter_options,
+            }
+        )
+    return parsed
+
+
+def output_response(output, mimetype):
+    """Streams a SpooledOutput, from memory or from its temporary file, a chunk at a time"""
+    return Response(
+        output.iter_chunks(RESPONSE_CHUNK_SIZE), mimetype=mimetype, headers={'Content-Length': str(output.size)}
+    )
+
+
+def serve(app):
+    if SERVER_MODE == 'production':
+        from waitress import serve as waitress_serve
+
+        logger.info(f"Serving on {LISTEN_INTERFACE}:{LISTEN_PORT} with {SERVER_THREADS} threads")
+        waitress_serve(app, host=LISTEN_INTERFACE, port=LISTEN_PORT, threads=SERVER_THREADS)
+    else:
+        app.run(host=LISTEN_INTERFACE, port=LISTEN_PORT, debug=True, threaded=True, use_reloader=False)
 
 
 def main():
     with tempfile.TemporaryDirectory() as tmpuserdir:
-        user_installation = Path(tmpuserdir).as_uri()
+        resource_limits = None
+        if LIBREOFFICE_MEMORY_LIMIT or LIBREOFFICE_CPU_LIMIT or LIBREOFFICE_ADDRESS_SPACE_LIMIT:
+            resource_limits = ResourceLimits(
+                memory_bytes=LIBREOFFICE_MEMORY_LIMIT,
+                cpus=LIBREOFFICE_CPU_LIMIT,
+                address_space_bytes=LIBREOFFICE_ADDRESS_SPACE_LIMIT,
+            )
 
-        libreoffice_server = UnoServer(
-            user_installation=user_installation,
-            conversion_timeout=CONVERSION_TIMEOUT,
-            memory_usage_ratio_limit=MEMORY_USAGE_RATIO_LIMIT
-        )
+        def make_pool(size, uno_port_base, name, conversion_timeout, memory_usage_ratio_limit, **options):
+            return UnoServerPool(
+                size=size,
+                uno_port_base=uno_port_base,
+                user_installation_root=os.path.join(tmpuserdir, name),
+                conversion_timeout=conversion_timeout,
+                memory_usage_ratio_limit=memory_usage_ratio_limit,
+                profile_template=PROFILE_TEMPLATE_DIR,
+                standby=STANDBY_WORKER,
+                recycle_policy=RecyclePolicy(
+                    max_conversions=RECYCLE_AFTER_CONVERSIONS,
+                    max_input_bytes=RECYCLE_AFTER_INPUT_BYTES,
+                    memory_trend_horizon=RECYCLE_MEMORY_TREND_HORIZON,
+                    idle_after=RECYCLE_IDLE_AFTER,
+                    idle_threshold=RECYCLE_IDLE_THRESHOLD,
+                ),
+                probe_interval=PROBE_INTERVAL,
+                probe_timeout=PROBE_TIMEOUT,
+                uno_transport=UNO_TRANSPORT,
+                warmup=WARMUP,
+                resource_limits=resource_limits,
+                filter_catalog_dir=FILTER_CATALOG_DIR,
+                **options,
+            )
+
+        if WORKER_GROUPS:
+            # Every group gets its own workers and queue, the rest goes to the default group
+            groups = []
+            admission_queues = {}
+            for index, (name, settings) in enumerate(WORKER_GROUP_SETTINGS.items()):
+                size = int(settings.get('size', 1))
+                admission_queues[name] = AdmissionQueue(
+                    capacity=size,
+                    max_waiting=int(settings.get('max_queue_size', size * 4)),
+                    max_wait_time=MAX_QUEUE_WAIT,
+                    name=name,
+                )
+                pool = make_pool(
+                    size,
+                    UNO_PORT_BASE + index * WORKER_GROUP_PORT_STRIDE,
+                    name,
+                    conversion_timeout=int(settings.get('conversion_timeout', CONVERSION_TIMEOUT)),
+                    memory_usage_ratio_limit=float(
+                        settings.get('memory_usage_ratio_limit', MEMORY_USAGE_RATIO_LIMIT)
+                    ),
+                    install_signal_handlers=False,
+                )
+                groups.append(
+                    WorkerGroup(
+                        name,
+                        pool,
+                        classes=settings.get('classes', [name]),
+                        admission_queue=admission_queues[name],
+                    )
+                )
+            libreoffice_server = DocumentRouter(groups, default='default')
+            signal.signal(signal.SIGTERM, libreoffice_server.signal_handler)
+            signal.signal(signal.SIGINT, libreoffice_server.signal_handler)
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, libreoffice_server.signal_handler)
+            # The groups queue their own conversions
+            admission_queue = None
+        else:
+            libreoffice_server = make_pool(
+                POOL_SIZE, UNO_PORT_BASE, 'default', CONVERSION_TIMEOUT, MEMORY_USAGE_RATIO_LIMIT
+            )
+            admission_queue = AdmissionQueue(
+                capacity=POOL_SIZE,
+                max_waiting=MAX_QUEUE_SIZE,
+                max_wait_time=MAX_QUEUE_WAIT,
+            )
+            admission_queues = {'default': admission_queue}
 
         libreoffice_server.start()
 
+        cache = None
+        if CACHE_MEMORY_BYTES or CACHE_DISK_BYTES:
+            cache = ConversionCache(
+                memory_budget=CACHE_MEMORY_BYTES,
+                disk_budget=CACHE_DISK_BYTES,
+                directory=CACHE_DIR,
+            )
+
+        conversion_service = ConversionService(
+            libreoffice_server,
+            cache=cache,
+            admission_queue=admission_queue,
+            coalesce=COALESCE_REQUESTS,
+            spool_threshold=OUTPUT_SPOOL_THRESHOLD,
+            spool_dir=OUTPUT_SPOOL_DIR,
+            max_queue_wait=MAX_QUEUE_WAIT,
+        )
+
+        job_manager = JobManager(
+            conversion_service,
+            spool_dir=JOB_SPOOL_DIR,
+            ttl=JOB_TTL,
+            workers=JOB_WORKERS,
+            max_queued=MAX_QUEUED_JOBS,
+            max_wait=JOB_MAX_QUEUE_WAIT,
+        )
+
+        # These components keep their own counters, they are read when /metrics is scraped
+        if cache is not None:
+            metrics.Counter(
+                'unoserver_cache_lookups_total',
+                'Result cache lookups, by result.',
+                ['result'],
+                function=lambda: {
+                    (result,): cache.stats()[result] for result in ('memory_hits', 'disk_hits', 'misses')
+                },
+            )
+            metrics.Counter(
+                'unoserver_cache_evictions_total',
+                'Results evicted from the cache, by tier.',
+                ['tier'],
+                function=lambda: {(tier,): cache.stats()[f'{tier}_evictions'] for tier in ('memory', 'disk')},
+            )
+            metrics.Gauge(
+                'unoserver_cache_bytes',
+                'Bytes of results in the cache, by tier.',
+                ['tier'],
+                function=lambda: {(tier,): cache.stats()[f'{tier}_bytes'] for tier in ('memory', 'disk')},
+            )
+        if conversion_service.single_flight is not None:
+            metrics.Counter(
+                'unoserver_coalesced_requests_total',
+                'Requests that shared the result of an identical conversion already in flight.',
+                function=lambda: conversion_service.single_flight.stats()['coalesced'],
+            )
+        metrics.Gauge(
+            'unoserver_jobs',
+            'Asynchronous jobs, by status.',
+            ['status'],
+            function=lambda: {(status,): count for status, count in job_manager.stats().items()},
+        )
+        metrics.Counter(
+            'unoserver_queue_rejections_total',
+            'Requests rejected by the admission queue, because it was full or they waited too long.',
+            ['group', 'reason'],
+            function=lambda: {
+                (name, reason): queue.stats()[key]
+                for name, queue in admission_queues.items()
+                for reason, key in (('full', 'rejected'), ('timeout', 'timed_out'))
+            },
+        )
+
         app = Flask(__name__)
+        request_tracker = RequestTracker(app.wsgi_app)
+        app.wsgi_app = request_tracker
+
+        def drain_pending():
+            jobs = job_manager.stats()
+            return {'requests': request_tracker.active, 'jobs': jobs[QUEUED] + jobs[RUNNING]}
+
+        def drain_shutdown():
+            libreoffice_server.shutdown()
+            # Stops the web server in the main thread, the workers are already gone
+            os.kill(os.getpid(), signal.SIGINT)
+
+        drainer = Drainer(DRAIN_GRACE_PERIOD, pending=drain_pending, shutdown=drain_shutdown)
+        signal.signal(signal.SIGTERM, lambda signum, frame: drainer.start())
+
+        @app.before_request
+        def refuse_while_draining():
+            if drainer.draining and request.method == 'POST':
+                return (
+                    jsonify({'error': 'The server is shutting down'}),
+                    503,
+                    {'Retry-After': '1', 'Connection': 'close'},
+                )
+
+        @app.errorhandler(QueueFullException)
+        def queue_full(e):
+            status = 503 if isinstance(e, QueueTimeoutException) else 429
+            return jsonify({'error': str(e)}), status, {'Retry-After': str(e.retry_after)}
+
+        @app.errorhandler(ConversionTimeoutException)
+        def conversion_timeout(e):
+            return jsonify({'error': str(e)}), 504
 
         @app.route('/convert-to-pdf', methods=['POST'])
         def convert_to_pdf_endpoint():
@@ -41,22 +426,195 @@ def main():
                 return jsonify({'error': 'Missing file'}), 400
 
             try:
-                file_bytes = uploaded_file.read()
-                pdf_bytes = libreoffice_server.convert_to_pdf(file_bytes)
-                pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
+                # The upload is spooled to a file by the form parser, LibreOffice reads it from there
+                pdf_output = conversion_service.convert_to_pdf_output(
+                    uploaded_file.stream,
+                    filename=uploaded_file.filename,
+                    timeout=requested_timeout(),
+                    update_index=requested_update_index(),
+                )
+            except (QueueFullException, ConversionTimeoutException):
+                raise
+            except LibreOfficeCrashedException as e:
+                # Most likely the document itself, ie it needs more memory than allowed
+                return jsonify({'error': f'Conversion failed: {str(e)}', 'reason': e.reason}), 500
+            except Exception as e:
+                return jsonify({'error': f'Conversion failed: {str(e)}'}), 500
+
+            if pdf_output is None:
+                return jsonify({'error': 'Conversion failed'}), 500
+
+            if wants_raw_response():
+                return output_response(pdf_output, 'application/pdf')
+
+            return jsonify({'pdfcontent': base64.b64encode(pdf_output.getvalue()).decode('utf-8')})
+
+        @app.route('/convert-batch', methods=['POST'])
+        def convert_batch_endpoint():
+            """Converts many documents, uploaded as `files` or as one zip `archive`
+
+            The results are streamed back as they finish, as a zip with a manifest.json,
+            or as multipart/mixed if the client accepts that.
+            """
+            archive = request.files.get('archive')
+            files = request.files.getlist('files')
+            if archive:
+                inputs = batch.iter_zip_inputs(archive.stream)
+            elif files:
+                inputs = batch.iter_uploaded_inputs(files)
+            else:
+                return jsonify({'error': 'Missing files or archive'}), 400
+
+            convert_to = request.form.get('convert_to', 'pdf')
+            results = batch.convert_batch(
+                conversion_service,
+                inputs,
+                BATCH_CONCURRENCY,
+                max_wait=MAX_QUEUE_WAIT,
+                convert_to=convert_to,
+                update_index=requested_update_index(),
+            )
+
+            best = request.accept_mimetypes.best_match(['application/zip', 'multipart/mixed'])
+            if best == 'multipart/mixed':
+                boundary = batch.multipart_boundary()
+                mimetype = mimetypes.guess_type(f'result.{convert_to}')[0] or 'application/octet-stream'
+                return Response(
+                    stream_with_context(batch.stream_multipart(results, convert_to, mimetype, boundary)),
+                    mimetype=f'multipart/mixed; boundary={boundary}',
+                )
+
+            return Response(
+                stream_with_context(batch.stream_zip(results, convert_to)),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="converted.zip"'},
+            )
+
+        @app.route('/convert-multi', methods=['POST'])
+        def convert_multi_endpoint():
+            """Loads one document once, and converts it to every format in `targets`
+
+            The outputs are streamed back as a zip, or as multipart/mixed if the
+            client accepts that.
+            """
+            uploaded_file = request.files.get('file')
+
+            if not uploaded_file:
+                return jsonify({'error': 'Missing file'}), 400
+
+            try:
+                targets = requested_targets()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            try:
+                outputs = conversion_service.convert_many(
+                    uploaded_file.stream,
+                    targets,
+                    update_index=requested_update_index(),
+                    filename=uploaded_file.filename,
+                    timeout=requested_timeout(),
+                )
+            except (QueueFullException, ConversionTimeoutException):
+                raise
+            except LibreOfficeCrashedException as e:
+                return jsonify({'error': f'Conversion failed: {str(e)}', 'reason': e.reason}), 500
             except Exception as e:
                 return jsonify({'error': f'Conversion failed: {str(e)}'}), 500
 
-            return jsonify({'pdfcontent': pdf_base64})
+            if any(output is None for output in outputs):
+                return jsonify({'error': 'Conversion failed'}), 500
+
+            names = batch.output_names(uploaded_file.filename, [target['convert_to'] for target in targets])
+            named_outputs = list(zip(names, outputs))
+            best = request.accept_mimetypes.best_match(['application/zip', 'multipart/mixed'])
+            if best == 'multipart/mixed':
+                boundary = batch.multipart_boundary()
+                return Response(
+                    batch.stream_outputs_multipart(named_outputs, boundary, RESPONSE_CHUNK_SIZE),
+                    mimetype=f'multipart/mixed; boundary={boundary}',
+                )
+
+            return Response(
+                batch.stream_outputs_zip(named_outputs, RESPONSE_CHUNK_SIZE),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="converted.zip"'},
+            )
+
+        @app.route('/jobs', methods=['POST'])
+        def create_job():
+            uploaded_file = request.files.get('file')
+
+            if not uploaded_file:
+                return jsonify({'error': 'Missing file'}), 400
+
+            job = job_manager.submit(
+                uploaded_file.stream,
+                filename=uploaded_file.filename,
+                convert_to=request.form.get('convert_to', 'pdf'),
+                update_index=requested_update_index(),
+            )
+            return jsonify(job.to_dict()), 202, {'Location': f'/jobs/{job.id}'}
+
+        @app.route('/jobs/<job_id>', methods=['GET'])
+        def get_job(job_id):
+            job = job_manager.get(job_id)
+            if job is None:
+                return jsonify({'error': 'Unknown job'}), 404
+            return jsonify(job.to_dict())
+
+        @app.route('/jobs/<job_id>/result', methods=['GET'])
+        def get_job_result(job_id):
+            job = job_manager.get(job_id)
+            if job is None:
+                return jsonify({'error': 'Unknown job'}), 404
+            if job.status != DONE:
+                return jsonify(job.to_dict()), 409
+            convert_to = job.options['convert_to']
+            return send_file(
+                job.output_path,
+                mimetype=mimetypes.guess_type(f'result.{convert_to}')[0] or 'application/octet-stream',
+                as_attachment=True,
+                download_name=f'{os.path.splitext(job.filename or job.id)[0]}.{convert_to}',
+            )
+
+        @app.route('/livez', methods=['GET'])
+        def liveness():
+            if libreoffice_server.is_alive:
+                return jsonify({'success': True, 'details': 'Alive'}), 200
+            return jsonify({'success': False, 'details': 'No LibreOffice answers'}), 500
+
+        @app.route('/readyz', methods=['GET'])
+        def readiness():
+            if drainer.draining:
+                return jsonify({'success': False, 'details': 'Draining'}), 503
+            if libreoffice_server.is_ready:
+                return jsonify({'success': True, 'details': 'Ready'}), 200
+            return jsonify({'success': False, 'details': 'No LibreOffice is ready'}), 503
+
+        @app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
 
         @app.route('/heartbeat', methods=['GET'])
         def heartbeat():
+            if admission_queue is not None:
+                stats = {'queue': admission_queue.stats()}
+            else:
+                stats = {'groups': libreoffice_server.stats()}
+            if cache is not None:
+                stats['cache'] = cache.stats()
+            if conversion_service.single_flight is not None:
+                stats['coalescing'] = conversion_service.single_flight.stats()
+            stats['workers'] = libreoffice_server.worker_status()
+            stats['jobs'] = job_manager.stats()
+            stats['draining'] = drainer.draining
             if libreoffice_server.is_server_stopped:
-                return jsonify({'success': False, 'details': 'Server is stopped'}), 500
+                return jsonify({'success': False, 'details': 'Server is stopped', **stats}), 500
             else:
-                return jsonify({'success': True, 'details': 'Server is running'}), 200
+                return jsonify({'success': True, 'details': 'Server is running', **stats}), 200
 
-        app.run(host=LISTEN_INTERFACE, port=LISTEN_PORT, debug=True, threaded=False, use_reloader=False)
+        serve(app)
 
 
 if __name__ == '__main__':
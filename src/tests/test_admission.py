@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from unoserver.admission import AdmissionQueue
+from unoserver.exceptions import QueueFullException, QueueTimeoutException
+
+
+class TestAdmissionQueue:
+    def test_admits_up_to_the_capacity(self):
+        queue = AdmissionQueue(capacity=2, max_waiting=0)
+        queue.acquire()
+        queue.acquire()
+        with pytest.raises(QueueFullException) as e:
+            queue.acquire()
+        assert e.value.retry_after >= 1
+        assert not isinstance(e.value, QueueTimeoutException)
+
+    def test_release_makes_room(self):
+        queue = AdmissionQueue(capacity=1, max_waiting=0)
+        queue.acquire()
+        queue.release()
+        queue.acquire()
+
+    def test_times_out_waiting(self):
+        queue = AdmissionQueue(capacity=1, max_waiting=1, max_wait_time=0.05)
+        queue.acquire()
+        with pytest.raises(QueueTimeoutException):
+            queue.acquire()
+        assert queue.stats()["timed_out"] == 1
+
+    def test_waiting_request_is_admitted_on_release(self):
+        queue = AdmissionQueue(capacity=1, max_waiting=1, max_wait_time=5)
+        queue.acquire()
+        admitted = threading.Event()
+
+        def wait():
+            queue.acquire()
+            admitted.set()
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        assert not admitted.wait(0.05)
+        queue.release()
+        assert admitted.wait(5)
+        thread.join()
+
+    def test_admit_releases_on_error(self):
+        queue = AdmissionQueue(capacity=1, max_waiting=0)
+        with pytest.raises(RuntimeError):
+            with queue.admit():
+                raise RuntimeError("Conversion failed")
+        with queue.admit():
+            pass
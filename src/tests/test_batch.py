@@ -0,0 +1,73 @@
+import io
+import json
+import zipfile
+
+from unoserver import batch
+from unoserver.exceptions import QueueFullException
+
+
+class FakeService:
+    """Converts by upper-casing, fails for documents called "broken"
+
+    The first `queue_full` calls are rejected by a full admission queue.
+    """
+
+    def __init__(self, queue_full=0):
+        self.queue_full = queue_full
+
+    def convert(self, data, filename=None, **options):
+        if self.queue_full:
+            self.queue_full -= 1
+            raise QueueFullException("The conversion queue is full", 0)
+        if filename.startswith("broken"):
+            raise RuntimeError("Could not load document")
+        return data.upper()
+
+
+def _inputs(*names):
+    return [(name, (lambda name=name: name.encode())) for name in names]
+
+
+class TestBatch:
+    def test_failing_items_dont_fail_the_batch(self):
+        results = batch.convert_batch(FakeService(), _inputs("a.doc", "broken.doc"), 2)
+        results = sorted(results, key=lambda result: result["index"])
+        assert [r["status"] for r in results] == ["ok", "error"]
+        assert results[0]["content"] == b"A.DOC"
+        assert results[1]["error"] == "Could not load document"
+
+    def test_items_wait_for_a_full_queue(self):
+        results = list(batch.convert_batch(FakeService(queue_full=3), _inputs("a.doc", "b.doc"), 1))
+        assert [r["status"] for r in results] == ["ok", "ok"]
+
+    def test_items_stop_waiting_after_max_wait(self):
+        results = list(batch.convert_batch(FakeService(queue_full=1000), _inputs("a.doc"), 1, max_wait=0.01))
+        assert results[0]["status"] == "error"
+        assert results[0]["error"] == "Timed out waiting in the conversion queue"
+
+    def test_stream_zip_with_manifest(self):
+        results = batch.convert_batch(FakeService(), _inputs("a.doc", "dir/a.docx", "broken.doc"), 1)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(batch.stream_zip(results, "pdf"))))
+        assert sorted(archive.namelist()) == ["a-1.pdf", "a.pdf", "manifest.json"]
+        # The results are in the order they finished, the names are the same either way
+        manifest = sorted(json.loads(archive.read("manifest.json")), key=lambda item: item["index"])
+        assert [(item["name"], item["status"]) for item in manifest] == [
+            ("a.doc", "ok"),
+            ("dir/a.docx", "ok"),
+            ("broken.doc", "error"),
+        ]
+        assert sorted(item.get("output") for item in manifest[:2]) == ["a-1.pdf", "a.pdf"]
+        assert archive.read(manifest[0]["output"]) == b"A.DOC"
+
+    def test_iter_zip_inputs(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("folder/", "")
+            archive.writestr("folder/a.doc", b"content")
+        inputs = list(batch.iter_zip_inputs(buffer))
+        assert [name for name, _ in inputs] == ["folder/a.doc"]
+        assert inputs[0][1]() == b"content"
+
+    def test_output_names(self):
+        names = batch.output_names("report.docx", ["pdf", "txt", "pdf"])
+        assert names == ["report.pdf", "report.txt", "report-2.pdf"]
@@ -0,0 +1,69 @@
+import io
+import os
+
+from unoserver.cache import ConversionCache, make_cache_key
+
+
+class TestCacheKey:
+    def test_same_input_same_key(self):
+        assert make_cache_key(b"document", convert_to="pdf") == make_cache_key(b"document", convert_to="pdf")
+
+    def test_file_and_bytes_give_the_same_key(self):
+        assert make_cache_key(io.BytesIO(b"document"), convert_to="pdf") == make_cache_key(
+            b"document", convert_to="pdf"
+        )
+
+    def test_options_change_the_key(self):
+        assert make_cache_key(b"document", convert_to="pdf") != make_cache_key(b"document", convert_to="png")
+        assert make_cache_key(b"document", convert_to="pdf") != make_cache_key(b"other", convert_to="pdf")
+
+
+class TestConversionCache:
+    def test_hit_and_miss(self):
+        cache = ConversionCache(memory_budget=100)
+        assert cache.get("a") is None
+        cache.put("a", b"result")
+        assert cache.get("a") == b"result"
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        cache = ConversionCache(memory_budget=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        # Using "a" makes "b" the least recently used one
+        cache.get("a")
+        cache.put("c", b"cccc")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"aaaa"
+        assert cache.get("c") == b"cccc"
+        stats = cache.stats()
+        assert stats["memory_evictions"] == 1
+        assert stats["memory_bytes"] == 8
+
+    def test_results_larger_than_the_budget_are_not_kept(self):
+        cache = ConversionCache(memory_budget=4)
+        cache.put("a", b"too large")
+        assert cache.get("a") is None
+        assert cache.stats()["memory_entries"] == 0
+
+    def test_disk_tier_serves_results_evicted_from_memory(self, tmp_path):
+        cache = ConversionCache(memory_budget=4, disk_budget=100, directory=str(tmp_path))
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        assert cache.get("a") == b"aaaa"
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_disk_budget_removes_files(self, tmp_path):
+        cache = ConversionCache(memory_budget=0, disk_budget=8, directory=str(tmp_path))
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.put("c", b"cccc")
+        assert sorted(os.listdir(tmp_path)) == ["b.bin", "c.bin"]
+        assert cache.stats()["disk_evictions"] == 1
+
+    def test_disk_tier_is_loaded_on_start(self, tmp_path):
+        ConversionCache(memory_budget=0, disk_budget=100, directory=str(tmp_path)).put("a", b"aaaa")
+        cache = ConversionCache(memory_budget=0, disk_budget=100, directory=str(tmp_path))
+        assert cache.get("a") == b"aaaa"
@@ -0,0 +1,99 @@
+import io
+import struct
+import zipfile
+
+from unoserver.classify import DRAWING, PRESENTATION, SPREADSHEET, TEXT, classify
+
+FREE = 0xFFFFFFFF
+END_OF_CHAIN = 0xFFFFFFFE
+FAT_SECTOR = 0xFFFFFFFD
+
+STORAGE = 1
+STREAM = 2
+ROOT = 5
+
+
+def directory_entry(name, entry_type, left=FREE, right=FREE, child=FREE):
+    encoded = (name + "\0").encode("utf-16-le")
+    entry = encoded.ljust(64, b"\0")
+    entry += struct.pack("<HBB", len(encoded), entry_type, 1)
+    entry += struct.pack("<III", left, right, child)
+    return entry.ljust(128, b"\0")
+
+
+def compound_file(*entries):
+    """A minimal compound file with 512 byte sectors: one FAT sector, then the directory"""
+    directory = b"".join(entries)
+    directory += b"\0" * (-len(directory) % 512)
+    directory_sectors = len(directory) // 512
+    fat = [FAT_SECTOR] + list(range(2, directory_sectors + 1)) + [END_OF_CHAIN]
+    fat += [FREE] * (128 - len(fat))
+    header = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 16
+    header += struct.pack("<HHHHH", 0x3E, 3, 0xFFFE, 9, 6) + b"\0" * 6
+    header += struct.pack("<IIIIIIIII", 0, 1, 1, 0, 4096, END_OF_CHAIN, 0, END_OF_CHAIN, 0)
+    header += struct.pack("<109I", 0, *([FREE] * 108))
+    return header + struct.pack("<128I", *fat) + directory
+
+
+def zip_file(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class TestClassify:
+    def test_word_document(self):
+        data = compound_file(
+            directory_entry("Root Entry", ROOT, child=2),
+            directory_entry("1Table", STREAM),
+            directory_entry("WordDocument", STREAM, left=1, right=3),
+            directory_entry("\x05SummaryInformation", STREAM),
+        )
+        assert classify(data) == TEXT
+        assert classify(io.BytesIO(data)) == TEXT
+
+    def test_workbook_with_an_embedded_word_document(self):
+        data = compound_file(
+            directory_entry("Root Entry", ROOT, child=1),
+            directory_entry("Workbook", STREAM, right=2),
+            directory_entry("MBD0001", STORAGE, child=3),
+            directory_entry("WordDocument", STREAM),
+        )
+        assert classify(data) == SPREADSHEET
+
+    def test_stream_names_in_the_content_are_ignored(self):
+        data = compound_file(
+            directory_entry("Root Entry", ROOT, child=1),
+            directory_entry("PowerPoint Document", STREAM),
+        )
+        assert classify(data + "WordDocument".encode("utf-16-le")) == PRESENTATION
+
+    def test_directory_over_several_sectors(self):
+        entries = [directory_entry("Root Entry", ROOT, child=1)]
+        # A chain of siblings, the Visio stream ends up in the second directory sector
+        entries += [directory_entry(f"Stream{i}", STREAM, right=i + 1) for i in range(1, 5)]
+        entries.append(directory_entry("VisioDocument", STREAM))
+        assert classify(compound_file(*entries)) == DRAWING
+
+    def test_broken_compound_file(self):
+        assert classify(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\xff" * 100) is None
+
+    def test_odf(self):
+        data = zip_file({"mimetype": "application/vnd.oasis.opendocument.spreadsheet", "content.xml": ""})
+        assert classify(data) == SPREADSHEET
+
+    def test_ooxml(self):
+        assert classify(zip_file({"[Content_Types].xml": "", "ppt/presentation.xml": ""})) == PRESENTATION
+
+    def test_file_is_left_at_the_start(self):
+        source = io.BytesIO(zip_file({"[Content_Types].xml": "", "word/document.xml": ""}))
+        assert classify(source) == TEXT
+        assert source.tell() == 0
+
+    def test_other_formats(self):
+        assert classify(b"%PDF-1.7") == DRAWING
+        assert classify(b"{\\rtf1\\ansi") == TEXT
+        assert classify(b"<!DOCTYPE html><html></html>") == TEXT
+        assert classify(b"plain text") is None
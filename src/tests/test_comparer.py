@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("uno")
+
+from unoserver import comparer  # noqa: E402
+
+
+class FakeDocument:
+    def supportsService(self, service):
+        return service == "com.sun.star.text.TextDocument"
+
+    def close(self, deliver_ownership):
+        pass
+
+
+class FakeDesktop:
+    def loadComponentFromURL(self, url, frame, flags, props):
+        return FakeDocument()
+
+
+class FakeTypeDetection:
+    def __init__(self):
+        self.descriptors = []
+
+    def queryTypeByDescriptor(self, props, deep):
+        self.descriptors.append({prop.Name: prop.Value for prop in props})
+        return ("writer8",)
+
+
+@pytest.fixture
+def uno_comparer(monkeypatch):
+    # The streams are stood in for by the data they're made from
+    monkeypatch.setattr(comparer.streams, "make_input_stream", lambda service, context, data: data)
+    uno_comparer = object.__new__(comparer.UnoComparer)
+    uno_comparer.service = uno_comparer.context = None
+    uno_comparer.desktop = FakeDesktop()
+    uno_comparer.type_service = FakeTypeDetection()
+    # Stops the comparison right after both documents are loaded
+    uno_comparer.is_comparable = lambda import_type, importOrg_type: False
+    return uno_comparer
+
+
+class TestUnoComparer:
+    def test_old_document_is_read_from_olddata(self, uno_comparer):
+        with pytest.raises(RuntimeError):
+            uno_comparer.compare(olddata=b"old document", newdata=b"new document", filetype="pdf")
+        assert uno_comparer.type_service.descriptors[0]["InputStream"] == b"old document"
@@ -0,0 +1,70 @@
+import logging
+import os
+import subprocess
+
+import pytest
+
+from unoserver import containment
+from unoserver.containment import ResourceLimits
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="The limits are applied by a POSIX shell")
+
+
+@pytest.fixture
+def fresh_cgroup_base(monkeypatch):
+    monkeypatch.setattr(containment, "_cgroup_base", False)
+
+
+class TestContainment:
+    def test_without_limits_the_command_is_unchanged(self):
+        assert ResourceLimits().contain("2002").wrap(["soffice", "--headless"]) == ["soffice", "--headless"]
+
+    def test_address_space_limit(self):
+        cmd = ResourceLimits(address_space_bytes=2 * 1024 ** 3).contain("2002").wrap(["sh", "-c", "ulimit -v"])
+        assert subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip() == str(2 * 1024 ** 2)
+
+    def test_process_joins_the_cgroup(self, tmp_path):
+        worker = ResourceLimits().contain("2002")
+        worker.cgroup = str(tmp_path / "a cgroup")
+        os.makedirs(worker.cgroup)
+        result = subprocess.run(worker.wrap(["sh", "-c", "echo $$"]), capture_output=True, text=True, check=True)
+        # The shell that joined the cgroup is the process that runs the command
+        assert (tmp_path / "a cgroup" / "cgroup.procs").read_text().strip() == result.stdout.strip()
+
+    def test_oom_kills(self, tmp_path):
+        worker = ResourceLimits().contain("2002")
+        assert worker.oom_kills() == 0
+        worker.cgroup = str(tmp_path)
+        (tmp_path / "memory.events").write_text("low 0\nhigh 0\nmax 3\noom 2\noom_kill 2\n")
+        assert worker.oom_kills() == 2
+
+    def test_no_cgroup_v2_is_a_warning(self, fresh_cgroup_base, monkeypatch, caplog):
+        monkeypatch.setattr(containment, "_read", lambda path: "1:name=systemd:/\n")
+        with caplog.at_level(logging.WARNING, logger="unoserver"):
+            assert containment.cgroup_base() is None
+        assert "limits of LibreOffice are not applied" in caplog.text
+
+    def test_cgroup_with_the_controllers_enabled(self, fresh_cgroup_base, monkeypatch, tmp_path):
+        files = {
+            "/proc/self/cgroup": "0::/service\n",
+            str(tmp_path / "service" / "cgroup.controllers"): "cpu memory pids\n",
+            str(tmp_path / "service" / "cgroup.subtree_control"): "cpu memory\n",
+        }
+        monkeypatch.setattr(containment, "CGROUP_ROOT", str(tmp_path))
+        monkeypatch.setattr(containment, "_read", files.__getitem__)
+        assert containment.cgroup_base() == str(tmp_path / "service")
+        # Nothing had to be enabled, so the server stays in its own cgroup
+        assert not (tmp_path / "service" / "unoserver").exists()
+
+    def test_server_moves_into_a_leaf_to_enable_the_controllers(self, fresh_cgroup_base, monkeypatch, tmp_path):
+        files = {
+            "/proc/self/cgroup": "0::/service\n",
+            str(tmp_path / "service" / "cgroup.controllers"): "cpu memory pids\n",
+            str(tmp_path / "service" / "cgroup.subtree_control"): "",
+        }
+        monkeypatch.setattr(containment, "CGROUP_ROOT", str(tmp_path))
+        monkeypatch.setattr(containment, "_read", files.__getitem__)
+        os.makedirs(tmp_path / "service")
+        assert containment.cgroup_base() == str(tmp_path / "service")
+        assert (tmp_path / "service" / "unoserver" / "cgroup.procs").read_text() == str(os.getpid())
+        assert (tmp_path / "service" / "cgroup.subtree_control").read_text() == "+cpu +memory"
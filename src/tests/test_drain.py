@@ -0,0 +1,43 @@
+import threading
+import time
+
+from unoserver.drain import Drainer
+
+
+class TestDrainer:
+    def test_shuts_down_once_nothing_is_pending(self):
+        pending = {"requests": 2, "jobs": 1}
+        shut_down = threading.Event()
+        drainer = Drainer(10, lambda: dict(pending), shut_down.set, interval=0.01)
+        drainer.start()
+        assert drainer.draining
+        time.sleep(0.05)
+        assert not shut_down.is_set()
+        pending.update(requests=0, jobs=0)
+        assert shut_down.wait(5)
+
+    def test_shuts_down_after_the_grace_period(self):
+        shut_down = threading.Event()
+        start = time.monotonic()
+        Drainer(0.05, lambda: {"requests": 1}, shut_down.set, interval=0.01).start()
+        assert shut_down.wait(5)
+        assert time.monotonic() - start >= 0.05
+
+    def test_start_is_idempotent(self):
+        calls = []
+        drainer = Drainer(10, lambda: {"requests": 0}, lambda: calls.append(1), interval=0.01)
+        drainer.start()
+        drainer.start()
+        time.sleep(0.05)
+        assert calls == [1]
+
+    def test_failing_shutdown_is_logged(self, caplog):
+        def shutdown():
+            raise RuntimeError("LibreOffice is gone")
+
+        drainer = Drainer(10, lambda: {}, shutdown, interval=0.01)
+        drainer.start()
+        deadline = time.monotonic() + 5
+        while "Shutting down after draining failed" not in caplog.text and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "Shutting down after draining failed" in caplog.text
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from unoserver import filters
+from unoserver.filters import FilterCatalog
+
+IMPORT_FILTERS = [
+    {"Name": "MS Word 2007 XML", "UserData": ("OXML", "", "true"), "Type": "writer_MS_Word_2007"},
+]
+EXPORT_FILTERS = [
+    {
+        "Name": "writer_pdf_Export",
+        "UIName": "PDF - Portable Document Format",
+        "Type": "pdf_Portable_Document_Format",
+        "DocumentService": "com.sun.star.text.TextDocument",
+        "UserData": ("PDFWriter", "/usr/lib/file.so"),
+        "Flags": 66,
+    },
+    {
+        "Name": "writer_web_pdf_Export",
+        "Type": "pdf_Portable_Document_Format",
+        "DocumentService": "com.sun.star.text.TextDocument",
+        "UserData": None,
+    },
+    {
+        "Name": "calc_pdf_Export",
+        "Type": "pdf_Portable_Document_Format",
+        "DocumentService": "com.sun.star.sheet.SpreadsheetDocument",
+        "UserData": (),
+        # Not JSON safe, like the uno values of a real filter
+        "Flags": object(),
+    },
+]
+TYPES = {"pdf": "pdf_Portable_Document_Format", "docx": "writer_MS_Word_2007"}
+
+
+@pytest.fixture
+def catalog():
+    return FilterCatalog("7.6.4.1", IMPORT_FILTERS, EXPORT_FILTERS, TYPES)
+
+
+@pytest.fixture(autouse=True)
+def no_cached_catalogs(monkeypatch):
+    monkeypatch.setattr(filters, "_catalogs", {})
+
+
+class TestFilterNames:
+    def test_names_and_user_data(self):
+        assert filters.filter_names(EXPORT_FILTERS) == {
+            "writer_pdf_Export": "writer_pdf_Export",
+            "PDFWriter": "writer_pdf_Export",
+            "writer_web_pdf_Export": "writer_web_pdf_Export",
+            "calc_pdf_Export": "calc_pdf_Export",
+        }
+
+
+class TestFilterCatalog:
+    def test_aliases(self, catalog):
+        assert catalog.import_aliases["OXML"] == "MS Word 2007 XML"
+        assert catalog.export_aliases["PDFWriter"] == "writer_pdf_Export"
+
+    def test_export_type(self, catalog):
+        assert catalog.export_type("pdf") == "pdf_Portable_Document_Format"
+        assert catalog.export_type(".DOCX") == "writer_MS_Word_2007"
+        assert catalog.export_type("xyz") is None
+
+    def test_first_export_filter_of_a_type_wins(self, catalog):
+        text = "com.sun.star.text.TextDocument"
+        assert catalog.find_export_filter(text, "pdf_Portable_Document_Format") == "writer_pdf_Export"
+        assert catalog.find_export_filter(text, "writer_MS_Word_2007") is None
+
+    def test_save_and_load(self, catalog, tmp_path):
+        path = catalog.save(str(tmp_path))
+        assert os.listdir(tmp_path) == [os.path.basename(path)]
+        loaded = FilterCatalog.load(str(tmp_path), "7.6.4.1")
+        assert loaded.to_dict() == catalog.to_dict()
+        assert loaded.export_aliases == catalog.export_aliases
+
+    def test_load_without_a_snapshot(self, tmp_path):
+        assert FilterCatalog.load(str(tmp_path), "7.6.4.1") is None
+
+    def test_load_a_broken_snapshot(self, tmp_path):
+        with open(FilterCatalog.snapshot_path(str(tmp_path), "7.6.4.1"), "w") as snapshot:
+            snapshot.write('{"version": ')
+        assert FilterCatalog.load(str(tmp_path), "7.6.4.1") is None
+
+    def test_snapshot_path_is_safe(self, tmp_path):
+        path = FilterCatalog.snapshot_path(str(tmp_path), "../7.6 beta")
+        assert os.path.dirname(path) == str(tmp_path)
+
+
+class TestGetCatalog:
+    def test_built_once_and_saved(self, catalog, tmp_path):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return catalog
+
+        assert filters.get_catalog("7.6.4.1", str(tmp_path), build) is catalog
+        assert filters.get_catalog("7.6.4.1", str(tmp_path), build) is catalog
+        assert builds == [1]
+        assert FilterCatalog.load(str(tmp_path), "7.6.4.1") is not None
+
+    def test_loaded_from_the_snapshot(self, catalog, tmp_path):
+        catalog.save(str(tmp_path))
+
+        def build():
+            raise AssertionError("The catalog was built again")
+
+        assert filters.get_catalog("7.6.4.1", str(tmp_path), build).to_dict() == catalog.to_dict()
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+from unoserver import inputs
+
+DOCUMENT = b"0123456789"
+
+
+@pytest.fixture(params=["bytes", "file"])
+def source(request):
+    if request.param == "bytes":
+        return DOCUMENT
+    source = io.BytesIO(DOCUMENT)
+    source.seek(4)
+    return source
+
+
+def left_at_the_start(source):
+    return not inputs.is_file(source) or source.tell() == 0
+
+
+class TestInputs:
+    def test_input_size(self, source):
+        assert inputs.input_size(source) == 10
+        assert left_at_the_start(source)
+
+    def test_iter_chunks(self, source):
+        assert [bytes(chunk) for chunk in inputs.iter_chunks(source, 4)] == [b"0123", b"4567", b"89"]
+        assert left_at_the_start(source)
+
+    def test_iter_chunks_stopped_early(self, source):
+        chunks = inputs.iter_chunks(source, 4)
+        next(chunks)
+        chunks.close()
+        assert left_at_the_start(source)
+
+    def test_read_head(self, source):
+        assert inputs.read_head(source, 3) == b"012"
+        assert left_at_the_start(source)
+
+    def test_read_at(self, source):
+        assert inputs.read_at(source, 8, 4) == b"89"
+        assert left_at_the_start(source)
+
+    def test_read_all(self, source):
+        assert inputs.read_all(source) == DOCUMENT
+        assert left_at_the_start(source)
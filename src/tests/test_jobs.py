@@ -0,0 +1,76 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from unoserver.exceptions import QueueFullException
+from unoserver.jobs import DONE, FAILED, JobManager
+from unoserver.outputs import SpooledOutput
+
+
+class UpperCaseService:
+    """Converts by upper-casing, the first `queue_full` calls find a full queue"""
+
+    def __init__(self, queue_full=0):
+        self.queue_full = queue_full
+        self.release = threading.Event()
+        self.release.set()
+
+    def convert_output(self, data, filename=None, **options):
+        self.release.wait(5)
+        if self.queue_full:
+            self.queue_full -= 1
+            raise QueueFullException("The conversion queue is full", 0)
+        return SpooledOutput.from_bytes(data.read().upper())
+
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.finished is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestJobManager:
+    def test_converts_in_the_background(self, tmp_path):
+        manager = JobManager(UpperCaseService(queue_full=2), spool_dir=str(tmp_path))
+        job = wait_for(manager.submit(io.BytesIO(b"text"), "a.txt"))
+        assert job.status == DONE
+        with open(job.output_path, "rb") as output:
+            assert output.read() == b"TEXT"
+        assert not os.path.exists(job.input_path)
+
+    def test_gives_up_on_a_full_queue_after_max_wait(self, tmp_path):
+        manager = JobManager(UpperCaseService(queue_full=1000), spool_dir=str(tmp_path), max_wait=0.01)
+        job = wait_for(manager.submit(io.BytesIO(b"text"), "a.txt"))
+        assert job.status == FAILED
+        assert job.error == "Timed out waiting in the conversion queue"
+
+    def test_max_queued(self, tmp_path):
+        service = UpperCaseService()
+        service.release.clear()
+        manager = JobManager(service, spool_dir=str(tmp_path), max_queued=1)
+        running = manager.submit(io.BytesIO(b"a"))
+        while running.started is None:
+            time.sleep(0.01)
+        manager.submit(io.BytesIO(b"b"))
+        with pytest.raises(QueueFullException):
+            manager.submit(io.BytesIO(b"c"))
+        service.release.set()
+
+    def test_expired_jobs_are_removed(self, tmp_path):
+        manager = JobManager(UpperCaseService(), spool_dir=str(tmp_path), ttl=0, cleanup_interval=0.01)
+        job = wait_for(manager.submit(io.BytesIO(b"text")))
+        deadline = time.monotonic() + 5
+        while manager.get(job.id) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert manager.get(job.id) is None
+        assert os.listdir(tmp_path) == []
+
+    def test_files_of_earlier_jobs_are_removed(self, tmp_path):
+        for name in ("old.in", "old.out", "unrelated.txt"):
+            (tmp_path / name).write_bytes(b"")
+        JobManager(UpperCaseService(), spool_dir=str(tmp_path))
+        assert os.listdir(tmp_path) == ["unrelated.txt"]
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from unoserver import metrics
+from unoserver.memory import MemorySampler, process_tree, read_smaps_rollup
+
+needs_smaps_rollup = pytest.mark.skipif(
+    not os.path.exists(f"/proc/{os.getpid()}/smaps_rollup"), reason="No /proc/<pid>/smaps_rollup"
+)
+
+
+@pytest.fixture
+def child():
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield process
+    process.kill()
+    process.wait()
+
+
+class TestReadSmapsRollup:
+    @needs_smaps_rollup
+    def test_own_process(self):
+        totals = read_smaps_rollup(os.getpid())
+        assert totals["rss"] >= totals["pss"] >= totals["uss"] > 0
+
+    def test_missing_process(self, child):
+        child.kill()
+        child.wait()
+        assert read_smaps_rollup(child.pid) is None
+
+
+class TestProcessTree:
+    def test_includes_children(self, child):
+        assert process_tree(os.getpid())[0] == os.getpid()
+        assert child.pid in process_tree(os.getpid())
+
+
+class TestMemorySampler:
+    def test_ring_buffer(self):
+        sampler = MemorySampler("test", history=2)
+        assert sampler.latest is None
+        samples = [sampler.sample(os.getpid()) for _ in range(3)]
+        assert list(sampler.samples) == samples[1:]
+        assert sampler.latest is samples[-1]
+        assert sampler.latest.rss > 0
+        sampler.clear()
+        assert sampler.latest is None
+
+    def test_sample_includes_children(self, child):
+        own = MemorySampler("test").measure(child.pid)
+        tree = MemorySampler("test").measure(os.getpid())
+        assert tree.rss > own.rss
+
+    def test_sample_sets_the_gauges(self):
+        sample = MemorySampler("test-gauges").sample(os.getpid())
+        assert f'unoserver_libreoffice_rss_bytes{{worker="test-gauges"}} {float(sample.rss)}' in (
+            metrics.LIBREOFFICE_RSS_BYTES.render()
+        )
+        metrics.LIBREOFFICE_RSS_BYTES.remove(worker="test-gauges")
+        metrics.LIBREOFFICE_PSS_BYTES.remove(worker="test-gauges")
+        metrics.LIBREOFFICE_USS_BYTES.remove(worker="test-gauges")
@@ -0,0 +1,57 @@
+import pytest
+
+from unoserver.metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics:
+    def test_counter(self):
+        registry = Registry()
+        counter = Counter("test_total", "A test counter.", ["reason"], registry=registry)
+        counter.inc(reason="crash")
+        counter.inc(2, reason="crash")
+        assert registry.render().splitlines() == [
+            "# HELP test_total A test counter.",
+            "# TYPE test_total counter",
+            'test_total{reason="crash"} 3.0',
+        ]
+
+    def test_labels_must_match(self):
+        counter = Counter("test_total", "A test counter.", ["reason"], registry=Registry())
+        with pytest.raises(ValueError):
+            counter.inc(cause="crash")
+
+    def test_label_values_are_escaped(self):
+        gauge = Gauge("test_value", "A test gauge.", ["name"], registry=Registry())
+        gauge.set(1, name='a "quoted"\nname')
+        assert 'test_value{name="a \\"quoted\\"\\nname"} 1.0' in gauge.render()
+
+    def test_remove_a_gauge_value(self):
+        gauge = Gauge("test_value", "A test gauge.", ["worker"], registry=Registry())
+        gauge.set(1, worker="2002")
+        gauge.set(2, worker="2003")
+        gauge.remove(worker="2002")
+        gauge.remove(worker="2004")
+        assert gauge.render()[2:] == ['test_value{worker="2003"} 2.0']
+
+    def test_function_backed_gauge(self):
+        gauge = Gauge("test_value", "A test gauge.", registry=Registry(), function=lambda: 7)
+        assert gauge.render()[-1] == "test_value 7.0"
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "A test histogram.", registry=Registry(), buckets=(1, 5))
+        histogram.observe(0.5)
+        histogram.observe(1)
+        histogram.observe(10)
+        assert histogram.render()[2:] == [
+            'test_seconds_bucket{le="1.0"} 2.0',
+            'test_seconds_bucket{le="5.0"} 2.0',
+            'test_seconds_bucket{le="+Inf"} 3.0',
+            "test_seconds_sum 11.5",
+            "test_seconds_count 3.0",
+        ]
+
+    def test_names_are_unique(self):
+        registry = Registry()
+        Counter("test_total", "A test counter.", registry=registry)
+        with pytest.raises(ValueError):
+            Counter("test_total", "A test counter.", registry=registry)
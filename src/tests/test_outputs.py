@@ -0,0 +1,60 @@
+import os
+
+from unoserver.outputs import SpooledOutput
+
+
+class TestSpooledOutput:
+    def test_stays_in_memory_below_the_threshold(self):
+        output = SpooledOutput(threshold=10)
+        output.write(b"12345")
+        output.write(b"67890")
+        assert not output.spilled
+        assert output.size == 10
+        assert output.getvalue() == b"1234567890"
+
+    def test_spills_above_the_threshold(self, tmp_path):
+        output = SpooledOutput(threshold=4, directory=str(tmp_path))
+        output.write(b"123")
+        output.write(b"456")
+        assert output.spilled
+        assert output.size == 6
+        assert output.getvalue() == b"123456"
+        assert len(os.listdir(tmp_path)) == 1
+
+    def test_temporary_file_is_removed(self, tmp_path):
+        output = SpooledOutput(threshold=1, directory=str(tmp_path))
+        output.write(b"123")
+        del output
+        assert os.listdir(tmp_path) == []
+
+    def test_reset(self, tmp_path):
+        output = SpooledOutput(threshold=4, directory=str(tmp_path))
+        output.write(b"partial result")
+        output.reset()
+        output.write(b"ok")
+        assert output.size == 2
+        assert output.getvalue() == b"ok"
+
+    def test_readers_are_independent(self):
+        output = SpooledOutput.from_bytes(b"abcdef")
+        with output.open() as first, output.open() as second:
+            assert first.read(3) == b"abc"
+            assert second.read() == b"abcdef"
+            assert first.read() == b"def"
+
+    def test_iter_chunks(self, tmp_path):
+        output = SpooledOutput(threshold=2, directory=str(tmp_path))
+        output.write(b"abcdefg")
+        assert list(output.iter_chunks(3)) == [b"abc", b"def", b"g"]
+
+    def test_save_spilled_output(self, tmp_path):
+        output = SpooledOutput(threshold=2, directory=str(tmp_path))
+        output.write(b"abcdefg")
+        output.save_to(str(tmp_path / "saved"))
+        assert (tmp_path / "saved").read_bytes() == b"abcdefg"
+        # Linked to the temporary file, not copied
+        assert os.stat(tmp_path / "saved").st_nlink == 2
+
+    def test_save_output_in_memory(self, tmp_path):
+        SpooledOutput.from_bytes(b"abc").save_to(str(tmp_path / "saved"))
+        assert (tmp_path / "saved").read_bytes() == b"abc"
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("uno")
+
+from unoserver import pool as pool_module  # noqa: E402
+from unoserver.pool import UnoServerPool  # noqa: E402
+
+
+class FlakyWorker:
+    """Stands in for a UnoServer whose LibreOffice fails to start `failures` times"""
+
+    def __init__(self, failures=0):
+        self.uno_port = "2002"
+        self.failures = failures
+        self.is_server_stopped = True
+        self.conversion_count = 0
+        self.started = threading.Event()
+        self.may_start = threading.Event()
+        self.may_start.set()
+
+    def kill_libreoffice(self):
+        self.is_server_stopped = True
+
+    def start(self, executable="libreoffice"):
+        self.may_start.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("LibreOffice did not start")
+        self.is_server_stopped = False
+        self.started.set()
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(pool_module, "RESTART_BACKOFF", 0.01)
+    # The tests put their own workers in the pool, no LibreOffice is started
+    monkeypatch.setattr(UnoServerPool, "_create_worker", lambda self: FlakyWorker())
+    pool = UnoServerPool(size=1, user_installation_root=str(tmp_path), install_signal_handlers=False)
+    yield pool
+    with pool._dispatch_condition:
+        pool._is_shut_down = True
+        pool._dispatch_condition.notify_all()
+
+
+class TestRestartWorker:
+    @pytest.mark.parametrize("drain", [True, False])
+    def test_failed_restart_is_tried_again(self, pool, drain):
+        worker = FlakyWorker(failures=3)
+        pool.workers = [worker]
+        pool._restart_worker(worker, drain)
+        assert worker.started.is_set()
+        assert pool.acquire_worker() is worker
+
+    def test_restart_stops_at_shut_down(self, pool):
+        worker = FlakyWorker(failures=1000)
+        pool.workers = [worker]
+        thread = threading.Thread(target=pool._restart_worker, args=(worker, False))
+        thread.start()
+        with pool._dispatch_condition:
+            pool._is_shut_down = True
+            pool._dispatch_condition.notify_all()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert not worker.started.is_set()
+
+    def test_worker_is_reserved_during_an_urgent_restart(self, pool):
+        worker = FlakyWorker()
+        worker.may_start.clear()
+        pool.workers = [worker]
+        # The timed out conversion still holds the worker
+        assert pool.acquire_worker() is worker
+        restart = threading.Thread(target=pool._restart_worker, args=(worker, False))
+        restart.start()
+        while worker not in pool._restarting_workers:
+            time.sleep(0.01)
+        pool.release_worker(worker)
+
+        acquired = []
+        acquire = threading.Thread(target=lambda: acquired.append(pool.acquire_worker()))
+        acquire.start()
+        acquire.join(0.1)
+        assert acquired == []
+        worker.may_start.set()
+        acquire.join(5)
+        restart.join(5)
+        assert acquired == [worker]
+        assert not worker.is_server_stopped
@@ -0,0 +1,44 @@
+import os
+import stat
+
+from unoserver import profile
+
+# Does what LibreOffice does with --terminate_after_init: populates the profile and exits
+FAKE_LIBREOFFICE = """#!/bin/sh
+for arg in "$@"; do
+    case "$arg" in
+        -env:UserInstallation=file://*) mkdir -p "${arg#-env:UserInstallation=file://}/user" ;;
+    esac
+done
+"""
+
+
+def fake_libreoffice(path):
+    path.write_text(FAKE_LIBREOFFICE)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+class TestProfileTemplate:
+    def test_template_is_built_once(self, tmp_path):
+        executable = fake_libreoffice(tmp_path / "soffice")
+        template = profile.ensure_profile_template(executable, str(tmp_path / "templates"))
+        assert os.path.isdir(os.path.join(template, "user"))
+        assert profile.ensure_profile_template(executable, str(tmp_path / "templates")) == template
+
+    def test_upgraded_libreoffice_gets_a_new_template(self, tmp_path):
+        executable = fake_libreoffice(tmp_path / "soffice")
+        old_template = profile.ensure_profile_template(executable, str(tmp_path / "templates"))
+        os.utime(executable, ns=(0, 0))
+        new_template = profile.ensure_profile_template(executable, str(tmp_path / "templates"))
+        assert new_template != old_template
+        assert os.listdir(tmp_path / "templates") == [os.path.basename(new_template)]
+
+    def test_failing_executable(self, tmp_path):
+        assert profile.ensure_profile_template("/bin/false", str(tmp_path / "templates")) is None
+
+    def test_seed_user_installation(self, tmp_path):
+        template = profile.ensure_profile_template(fake_libreoffice(tmp_path / "soffice"), str(tmp_path / "templates"))
+        target = tmp_path / "instance"
+        profile.seed_user_installation(target.as_uri(), template)
+        assert (target / "user").is_dir()
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from unoserver.memory import MemorySample
+from unoserver.recycling import RecyclePolicy, memory_slope
+
+MB = 1024 ** 2
+
+
+def _samples(*used, interval=1.0):
+    return [MemorySample(time=i * interval, rss=u, pss=u, uss=u, used=u) for i, u in enumerate(used)]
+
+
+@pytest.fixture
+def server():
+    """What the policy looks at of a worker, a fresh one with flat memory use"""
+    return SimpleNamespace(
+        conversions_since_start=0,
+        input_bytes_since_start=0,
+        memory_usage_threshold=1000 * MB,
+        memory_samples=_samples(100 * MB, 100 * MB, 100 * MB),
+        last_activity=None,
+        is_busy=False,
+    )
+
+
+class TestMemorySlope:
+    def test_needs_three_samples(self):
+        assert memory_slope(_samples(1, 2)) is None
+
+    def test_linear_growth(self):
+        assert memory_slope(_samples(100, 200, 300, 400)) == 100
+
+    def test_flat(self):
+        assert memory_slope(_samples(100, 100, 100)) == 0
+
+    def test_samples_at_the_same_time(self):
+        assert memory_slope(_samples(100, 200, 300, interval=0)) is None
+
+
+class TestRecyclePolicy:
+    def test_nothing_to_do(self, server):
+        server.conversions_since_start = 3
+        assert RecyclePolicy(max_conversions=10).check(server) is None
+
+    def test_max_conversions(self, server):
+        server.conversions_since_start = 10
+        reason, _ = RecyclePolicy(max_conversions=10).check(server)
+        assert reason == "conversions"
+
+    def test_max_input_bytes(self, server):
+        server.input_bytes_since_start = 1000
+        reason, _ = RecyclePolicy(max_input_bytes=1000).check(server)
+        assert reason == "input_bytes"
+
+    def test_memory_trend(self, server):
+        # 100mb/s from 500mb, the 1000mb limit is reached in 5 seconds
+        server.memory_samples = _samples(200 * MB, 300 * MB, 400 * MB, 500 * MB)
+        assert RecyclePolicy(memory_trend_horizon=10).check(server)[0] == "memory_trend"
+        assert RecyclePolicy(memory_trend_horizon=1).check(server) is None
+
+    def test_idle_with_most_of_a_limit_used(self, server):
+        policy = RecyclePolicy(max_conversions=10, idle_after=5, idle_threshold=0.8)
+        server.conversions_since_start = 8
+        server.last_activity = 100.0
+        assert policy.check(server, now=104.0) is None
+        assert policy.check(server, now=106.0)[0] == "idle"
+
+    def test_idle_but_busy(self, server):
+        policy = RecyclePolicy(max_conversions=10, idle_after=5)
+        server.conversions_since_start = 9
+        server.last_activity = 100.0
+        server.is_busy = True
+        assert policy.check(server, now=200.0) is None
@@ -0,0 +1,76 @@
+import pytest
+
+from unoserver.admission import AdmissionQueue
+from unoserver.classify import DRAWING, SPREADSHEET, TEXT
+from unoserver.exceptions import UnoServerException
+from unoserver.routing import DocumentRouter, WorkerGroup
+
+
+class RecordingBackend:
+    """Stands in for a pool, and remembers what it converted"""
+
+    libreoffice_version = "7.6"
+    is_ready = True
+
+    def __init__(self, fails_to_start=False):
+        self.converted = []
+        self.started = False
+        self.fails_to_start = fails_to_start
+
+    def convert(self, file_content, **options):
+        self.converted.append(file_content)
+        return b"converted"
+
+    def convert_many(self, file_content, targets, **options):
+        self.converted.append(file_content)
+        return [b"converted" for _ in targets]
+
+    def start(self, executable="libreoffice"):
+        if self.fails_to_start:
+            raise UnoServerException("LibreOffice did not start")
+        self.started = True
+
+
+@pytest.fixture
+def groups():
+    return {
+        "default": WorkerGroup("default", RecordingBackend(), classes=[TEXT]),
+        "drawing": WorkerGroup(
+            "drawing",
+            RecordingBackend(),
+            classes=[DRAWING],
+            admission_queue=AdmissionQueue(capacity=1, max_waiting=1, name="drawing"),
+        ),
+    }
+
+
+class TestDocumentRouter:
+    def test_documents_go_to_the_group_of_their_class(self, groups):
+        router = DocumentRouter(groups.values(), default="default")
+        assert router.convert(b"%PDF-1.7", convert_to="png") == b"converted"
+        assert router.convert_many(b"{\\rtf1\\ansi", [{"convert_to": "pdf"}]) == [b"converted"]
+        assert groups["drawing"].backend.converted == [b"%PDF-1.7"]
+        assert groups["default"].backend.converted == [b"{\\rtf1\\ansi"]
+        assert groups["drawing"].admission_queue.stats()["in_flight"] == 0
+
+    def test_unknown_documents_go_to_the_default_group(self, groups):
+        router = DocumentRouter(groups.values(), default="default")
+        assert router.group_for(b"plain text") is groups["default"]
+
+    def test_default_group_must_exist(self, groups):
+        with pytest.raises(ValueError):
+            DocumentRouter(groups.values(), default="spreadsheet")
+
+    def test_class_in_more_than_one_group(self, groups):
+        groups["spreadsheet"] = WorkerGroup("spreadsheet", RecordingBackend(), classes=[SPREADSHEET, TEXT])
+        with pytest.raises(ValueError):
+            DocumentRouter(groups.values(), default="default")
+
+    def test_start_starts_every_group(self, groups):
+        DocumentRouter(groups.values(), default="default").start()
+        assert all(group.backend.started for group in groups.values())
+
+    def test_start_fails_if_a_group_fails(self, groups):
+        groups["drawing"].backend.fails_to_start = True
+        with pytest.raises(UnoServerException):
+            DocumentRouter(groups.values(), default="default").start()
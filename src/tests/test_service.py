@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from unoserver.admission import AdmissionQueue
+from unoserver.service import ConversionService
+
+
+class UpperCaseBackend:
+    libreoffice_version = "7.6"
+
+    def __init__(self):
+        self.conversions = 0
+
+    def convert(self, file_content, timeout=None, outfile=None, **options):
+        self.conversions += 1
+        outfile.write(file_content.upper())
+        return outfile
+
+
+class TestConversionService:
+    def test_coalesced_request_waits_for_a_queued_conversion(self):
+        backend = UpperCaseBackend()
+        queue = AdmissionQueue(capacity=1, max_waiting=10, max_wait_time=5)
+        service = ConversionService(backend, admission_queue=queue)
+        assert service.max_queue_wait == 5
+
+        occupied = threading.Event()
+        release = threading.Event()
+
+        def occupy():
+            with queue.admit():
+                occupied.set()
+                release.wait(5)
+
+        with ThreadPoolExecutor(3) as executor:
+            executor.submit(occupy)
+            occupied.wait(5)
+            leader = executor.submit(service.convert, b"doc", timeout=0.1)
+            while service.single_flight.stats()["in_flight"] == 0:
+                pass
+            follower = executor.submit(service.convert, b"doc", timeout=0.1)
+            # Both requests are past their timeout before the conversion is admitted
+            follower_done = threading.Event()
+            follower.add_done_callback(lambda future: follower_done.set())
+            assert not follower_done.wait(0.3)
+            release.set()
+            assert leader.result() == b"DOC"
+            assert follower.result() == b"DOC"
+        assert backend.conversions == 1
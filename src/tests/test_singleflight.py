@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from unoserver.exceptions import ConversionTimeoutException
+from unoserver.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_followers_share_the_result(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+
+        def convert():
+            started.set()
+            finish.wait(5)
+            return "pdf"
+
+        with ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(flight.do, "key", convert)
+            started.wait(5)
+            follower = executor.submit(flight.do, "key", lambda: "not called")
+            finish.set()
+            assert leader.result() == "pdf"
+            assert follower.result() == "pdf"
+        assert flight.stats() == {"in_flight": 0, "coalesced": 1}
+
+    def test_followers_share_the_error(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+        error = RuntimeError("Conversion failed")
+
+        def convert():
+            started.set()
+            finish.wait(5)
+            raise error
+
+        with ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(flight.do, "key", convert)
+            started.wait(5)
+            follower = executor.submit(flight.do, "key", lambda: "not called")
+            finish.set()
+            with pytest.raises(RuntimeError):
+                leader.result()
+            assert follower.exception() is error
+
+    def test_follower_gives_up_after_its_timeout(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+
+        def convert():
+            started.set()
+            finish.wait(5)
+            return "pdf"
+
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(flight.do, "key", convert)
+            started.wait(5)
+            with pytest.raises(ConversionTimeoutException):
+                flight.do("key", lambda: "not called", timeout=0.01)
+            finish.set()
+            assert leader.result() == "pdf"
+
+    def test_calls_after_the_leader_finished_run_again(self):
+        flight = SingleFlight()
+        assert flight.do("key", lambda: 1) == 1
+        assert flight.do("key", lambda: 2) == 2
+        assert flight.stats()["coalesced"] == 0
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+pytest.importorskip("uno")
+
+from unoserver.streams import FileInputStream, OutputStream  # noqa: E402
+
+
+class TestFileInputStream:
+    def test_read_in_chunks(self):
+        stream = FileInputStream(io.BytesIO(b"0123456789"))
+        assert stream.getLength() == 10
+        count, data = stream.readBytes(None, 4)
+        assert (count, data.value) == (4, b"0123")
+        assert stream.available() == 6
+        count, data = stream.readSomeBytes(None, 100)
+        assert (count, data.value) == (6, b"456789")
+        assert stream.available() == 0
+
+    def test_starts_at_the_start(self):
+        source = io.BytesIO(b"0123456789")
+        source.seek(5)
+        assert FileInputStream(source).getPosition() == 0
+
+    def test_seek_and_skip(self):
+        stream = FileInputStream(io.BytesIO(b"0123456789"))
+        stream.seek(6)
+        assert stream.readBytes(None, 2)[1].value == b"67"
+        stream.seek(1)
+        stream.skipBytes(2)
+        assert stream.getPosition() == 3
+        assert stream.readBytes(None, 1)[1].value == b"3"
+
+    def test_close_leaves_the_file_open(self):
+        source = io.BytesIO(b"0123456789")
+        FileInputStream(source).closeInput()
+        assert not source.closed
+
+
+class TestOutputStream:
+    def test_writes_to_the_sink(self):
+        class Chunk:
+            def __init__(self, value):
+                self.value = value
+
+        sink = io.BytesIO()
+        stream = OutputStream(sink)
+        stream.writeBytes(Chunk(b"abc"))
+        stream.writeBytes(Chunk(b"def"))
+        assert sink.getvalue() == b"abcdef"
+        assert stream.buffer is None
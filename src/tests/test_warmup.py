@@ -0,0 +1,16 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from unoserver import warmup
+
+OFFICE = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+
+
+class TestSamples:
+    @pytest.mark.parametrize("module", sorted(warmup.SAMPLES))
+    def test_sample_is_flat_odf(self, module):
+        sample, _ = warmup.SAMPLES[module]
+        document = ElementTree.fromstring(sample)
+        assert document.tag == f"{{{OFFICE}}}document"
+        assert document.get(f"{{{OFFICE}}}mimetype") == f"application/vnd.oasis.opendocument.{module}"
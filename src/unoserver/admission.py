@@ -0,0 +1,118 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from unoserver import metrics
+from unoserver.exceptions import QueueFullException, QueueTimeoutException
+
+logger = logging.getLogger("unoserver")
+
+
+class AdmissionQueue:
+    """A bounded wait queue in front of the conversion backend
+
+    At most `capacity` requests are let through at the same time, and at most
+    `max_waiting` requests wait for their turn. Anything beyond that is rejected
+    immediately, instead of piling up sockets and threads in the web server.
+
+    `name` tells the queues of different worker groups apart in the metrics.
+    """
+
+    def __init__(self, capacity, max_waiting, max_wait_time=None, name="default"):
+        if capacity < 1:
+            raise ValueError("The admission capacity must be at least 1")
+        if max_waiting < 0:
+            raise ValueError("The admission queue size can not be negative")
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.max_wait_time = max_wait_time
+        self.name = name
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._total_wait_time = 0.0
+        self._max_seen_wait_time = 0.0
+        self._average_service_time = None
+
+    def retry_after(self):
+        """A guess of how many seconds it takes until there is room in the queue"""
+        service_time = self._average_service_time or 1.0
+        rounds = (self._waiting + self._in_flight) / self.capacity
+        return max(1, math.ceil(service_time * rounds))
+
+    def acquire(self):
+        with self._condition:
+            if self._in_flight >= self.capacity and self._waiting >= self.max_waiting:
+                self._rejected += 1
+                raise QueueFullException("The conversion queue is full", self.retry_after())
+
+            start = time.monotonic()
+            self._waiting += 1
+            metrics.QUEUE_DEPTH.set(self._waiting, group=self.name, state="waiting")
+            try:
+                while self._in_flight >= self.capacity:
+                    if self.max_wait_time is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self.max_wait_time - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._timed_out += 1
+                        raise QueueTimeoutException(
+                            "Timed out waiting in the conversion queue", self.retry_after()
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+                metrics.QUEUE_DEPTH.set(self._waiting, group=self.name, state="waiting")
+
+            wait_time = time.monotonic() - start
+            self._in_flight += 1
+            metrics.QUEUE_DEPTH.set(self._in_flight, group=self.name, state="in_flight")
+            self._admitted += 1
+            self._total_wait_time += wait_time
+            self._max_seen_wait_time = max(self._max_seen_wait_time, wait_time)
+            return wait_time
+
+    def release(self, service_time=None):
+        with self._condition:
+            self._in_flight -= 1
+            metrics.QUEUE_DEPTH.set(self._in_flight, group=self.name, state="in_flight")
+            if service_time is not None:
+                # An exponential moving average, only used to estimate Retry-After
+                if self._average_service_time is None:
+                    self._average_service_time = service_time
+                else:
+                    self._average_service_time = 0.9 * self._average_service_time + 0.1 * service_time
+            self._condition.notify()
+
+    @contextmanager
+    def admit(self):
+        wait_time = self.acquire()
+        metrics.WAIT_SECONDS.observe(wait_time, stage="queue")
+        if wait_time > 0.001:
+            logger.debug(f"Request waited {wait_time:.3f}s in the conversion queue")
+        start = time.monotonic()
+        try:
+            yield wait_time
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "capacity": self.capacity,
+                "max_waiting": self.max_waiting,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "average_wait_time": self._total_wait_time / self._admitted if self._admitted else 0.0,
+                "max_wait_time": self._max_seen_wait_time,
+            }
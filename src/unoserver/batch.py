@@ -0,0 +1,227 @@
+import json
+import logging
+import mimetypes
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from unoserver.inputs import is_file
+from unoserver.exceptions import QueueFullException, QueueTimeoutException
+
+logger = logging.getLogger("unoserver")
+
+
+def iter_zip_inputs(fileobj):
+    """Yields (name, read) for every file in a zip archive
+
+    The members are only read when `read` is called, so the whole batch is never
+    held in memory at the same time.
+    """
+    archive = zipfile.ZipFile(fileobj)
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        yield info.filename, (lambda info=info: archive.read(info))
+
+
+def iter_uploaded_inputs(files):
+    """Yields (name, read) for a list of uploaded files
+
+    `read` gives the spooled upload itself, which is converted without reading it
+    into memory.
+    """
+    for uploaded_file in files:
+        yield uploaded_file.filename, (lambda uploaded_file=uploaded_file: uploaded_file.stream)
+
+
+def _convert_when_admitted(service, data, name, options, max_wait):
+    # A full queue says nothing about the document, so wait and try again, like a job
+    # does, but only for `max_wait` seconds in total
+    deadline = None if max_wait is None else time.monotonic() + max_wait
+    while True:
+        try:
+            return service.convert(data, filename=name, **options)
+        except QueueFullException as e:
+            delay = e.retry_after
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueueTimeoutException("Timed out waiting in the conversion queue", e.retry_after) from e
+                delay = min(delay, remaining)
+            if is_file(data):
+                data.seek(0)
+            time.sleep(delay)
+
+
+def _convert_item(service, index, name, read, options, max_wait):
+    start = time.monotonic()
+    item = {"index": index, "name": name}
+    try:
+        item["content"] = _convert_when_admitted(service, read(), name, options, max_wait)
+        if item["content"] is None:
+            raise RuntimeError("Conversion failed")
+        item["status"] = "ok"
+    except Exception as e:
+        logger.warning(f"Batch item {name} failed: {e}")
+        item["status"] = "error"
+        item["error"] = str(e)
+        item["content"] = None
+    item["duration"] = time.monotonic() - start
+    return item
+
+
+def convert_batch(service, inputs, concurrency, max_wait=None, **options):
+    """Converts (name, read) inputs, yielding the results as they finish
+
+    At most `concurrency` conversions run at once, and only twice that many
+    inputs are read ahead. A failing input gives an item with an error status,
+    it doesn't fail the batch. Items wait for room in a full admission queue,
+    for at most `max_wait` seconds each.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for index, (name, read) in enumerate(inputs):
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_convert_item, service, index, name, read, options, max_wait))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def _output_name(item, extension, used_names):
+    stem = os.path.splitext(os.path.basename(item["name"] or f"document-{item['index']}"))[0]
+    name = f"{stem}.{extension}"
+    if name in used_names:
+        name = f"{stem}-{item['index']}.{extension}"
+    used_names.add(name)
+    return name
+
+
+def _status(item, output_name=None):
+    status = {key: item[key] for key in ("index", "name", "status", "duration")}
+    if output_name is not None:
+        status["output"] = output_name
+    if item["status"] != "ok":
+        status["error"] = item["error"]
+    return status
+
+
+class _StreamBuffer:
+    """A write-only, unseekable file that zipfile can stream into"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(results, extension):
+    """Streams batch results as a zip, ending with a manifest.json of all item statuses"""
+    buffer = _StreamBuffer()
+    manifest = []
+    used_names = set()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for item in results:
+            if item["status"] == "ok":
+                output_name = _output_name(item, extension, used_names)
+                archive.writestr(output_name, item["content"])
+                manifest.append(_status(item, output_name))
+            else:
+                manifest.append(_status(item))
+            yield buffer.pop()
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield buffer.pop()
+
+
+def multipart_boundary():
+    return f"unoserver-batch-{uuid.uuid4().hex}"
+
+
+def stream_multipart(results, extension, mimetype, boundary):
+    """Streams batch results as multipart/mixed, one part per item
+
+    Each part carries its status in an X-Conversion-Status header. Failed items
+    have a JSON body describing the error.
+    """
+    used_names = set()
+    for item in results:
+        if item["status"] == "ok":
+            output_name = _output_name(item, extension, used_names)
+            content_type = mimetype
+            body = item["content"]
+        else:
+            output_name = None
+            content_type = "application/json"
+            body = json.dumps(_status(item)).encode("utf-8")
+
+        headers = [
+            f"--{boundary}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"X-Conversion-Status: {item['status']}",
+            f"X-Conversion-Index: {item['index']}",
+            f"X-Conversion-Source: {json.dumps(item['name'])}",
+        ]
+        if output_name is not None:
+            headers.append(f'Content-Disposition: attachment; filename="{output_name}"')
+        yield ("\r\n".join(headers) + "\r\n\r\n").encode("utf-8")
+        yield body
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode("utf-8")
+
+
+def output_names(filename, extensions):
+    """A distinct file name for each output of one document, ie report.pdf and report.png"""
+    stem = os.path.splitext(os.path.basename(filename or "document"))[0]
+    names = []
+    for index, extension in enumerate(extensions):
+        name = f"{stem}.{extension}"
+        if name in names:
+            name = f"{stem}-{index}.{extension}"
+        names.append(name)
+    return names
+
+
+def stream_outputs_zip(named_outputs, chunk_size):
+    """Streams (name, SpooledOutput) pairs as a zip, a chunk at a time"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, output in named_outputs:
+            with archive.open(name, "w", force_zip64=output.size > zipfile.ZIP64_LIMIT) as member:
+                for chunk in output.iter_chunks(chunk_size):
+                    member.write(chunk)
+                    yield buffer.pop()
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def stream_outputs_multipart(named_outputs, boundary, chunk_size):
+    """Streams (name, SpooledOutput) pairs as multipart/mixed, one part per output"""
+    for name, output in named_outputs:
+        headers = [
+            f"--{boundary}",
+            f"Content-Type: {mimetypes.guess_type(name)[0] or 'application/octet-stream'}",
+            f"Content-Length: {output.size}",
+            f'Content-Disposition: attachment; filename="{name}"',
+        ]
+        yield ("\r\n".join(headers) + "\r\n\r\n").encode("utf-8")
+        yield from output.iter_chunks(chunk_size)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode("utf-8")
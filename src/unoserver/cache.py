@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from unoserver import inputs
+
+logger = logging.getLogger("unoserver")
+
+
+def make_cache_key(data, **params) -> str:
+    """A content address for a conversion
+
+    The key is a hash of the input, bytes or a file, together with everything that
+    can change the output: target format, filters, options and the LibreOffice version.
+    """
+    digest = hashlib.sha256()
+    for chunk in inputs.iter_chunks(data):
+        digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """A two tier LRU cache of conversion results
+
+    The memory tier keeps the most recently used results, up to `memory_budget`
+    bytes. If a directory is given, every result is also written to disk, which
+    is bounded by `disk_budget` bytes. Results evicted from memory can then still
+    be served from disk.
+    """
+
+    def __init__(self, memory_budget, disk_budget=0, directory=None):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget if directory else 0
+        self.directory = directory
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_budget:
+            os.makedirs(directory, exist_ok=True)
+            self._load_disk_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _load_disk_index(self):
+        # Rebuild the LRU order from the modification times, oldest first.
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._evict_disk()
+        logger.info(f"Loaded {len(self._disk)} cached results ({self._disk_size} bytes) from {self.directory}")
+
+    def _evict_memory(self):
+        while self._memory_size > self.memory_budget and self._memory:
+            _, value = self._memory.popitem(last=False)
+            self._memory_size -= len(value)
+            self.memory_evictions += 1
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_budget and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.disk_evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key, value):
+        if len(value) > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = value
+        self._memory_size += len(value)
+        self._evict_memory()
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            on_disk = key in self._disk
+
+        if on_disk:
+            # Reading the file happens outside the lock, so memory hits don't wait for it.
+            try:
+                with open(self._path(key), "rb") as cached:
+                    value = cached.read()
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                value = None
+
+            if value is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value: bytes):
+        with self._lock:
+            self._remember(key, value)
+            if not self.disk_budget or key in self._disk or len(value) > self.disk_budget:
+                return
+
+        # Write to a temporary file first, so a reader never sees half a result.
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmpfile:
+                tmpfile.write(value)
+            os.replace(tmppath, self._path(key))
+        except OSError:
+            logger.exception("Could not write the conversion result to the cache")
+            try:
+                os.unlink(tmppath)
+            except FileNotFoundError:
+                pass
+            return
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(value)
+                self._disk_size += len(value)
+            self._evict_disk()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
@@ -0,0 +1,211 @@
+import io
+import re
+import struct
+import zipfile
+
+from unoserver import inputs
+
+# The document classes, and the LibreOffice document service (see converter.DOC_TYPES)
+# that opens each of them.
+TEXT = "text"
+SPREADSHEET = "spreadsheet"
+PRESENTATION = "presentation"
+DRAWING = "drawing"
+
+DOCUMENT_SERVICES = {
+    TEXT: "com.sun.star.text.TextDocument",
+    SPREADSHEET: "com.sun.star.sheet.SpreadsheetDocument",
+    PRESENTATION: "com.sun.star.presentation.PresentationDocument",
+    DRAWING: "com.sun.star.drawing.DrawingDocument",
+}
+
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+_ODF_MIMETYPES = {
+    "text": TEXT,
+    "text-template": TEXT,
+    "text-master": TEXT,
+    "text-web": TEXT,
+    "spreadsheet": SPREADSHEET,
+    "spreadsheet-template": SPREADSHEET,
+    "presentation": PRESENTATION,
+    "presentation-template": PRESENTATION,
+    "graphics": DRAWING,
+    "graphics-template": DRAWING,
+}
+
+_OOXML_FOLDERS = {
+    "word/": TEXT,
+    "xl/": SPREADSHEET,
+    "ppt/": PRESENTATION,
+    "visio/": DRAWING,
+}
+
+# The names of the main streams of the binary Office formats, which are in the root
+# storage. Embedded objects are in storages of their own, so they are never seen.
+_OLE_STREAMS = (
+    ("WordDocument", TEXT),
+    ("PowerPoint Document", PRESENTATION),
+    ("Workbook", SPREADSHEET),
+    ("Book", SPREADSHEET),
+    ("VisioDocument", DRAWING),
+)
+
+# Compound files are made of sectors, chained together in the FAT
+_OLE_END_OF_CHAIN = 0xFFFFFFFE
+_OLE_NO_STREAM = 0xFFFFFFFF
+_OLE_HEADER_FAT_SECTORS = 109
+# The root storage of an Office file has a handful of entries, this is just a bound
+# for broken or hostile files
+_OLE_MAX_DIRECTORY_SECTORS = 256
+
+_ODF_MIMETYPE_ATTRIBUTE = re.compile(rb'office:mimetype="application/vnd\.oasis\.opendocument\.([a-z-]+)"')
+
+_XML_MARKERS = (
+    (b"urn:schemas-microsoft-com:office:spreadsheet", SPREADSHEET),
+    (b"schemas.microsoft.com/office/word/2003/wordml", TEXT),
+    (b"<html", TEXT),
+    (b"<!doctype html", TEXT),
+)
+
+
+def classify(data):
+    """Guesses the class of a document from its content, without LibreOffice
+
+    Only the container is looked at: the zip directory of ODF and OOXML files, the
+    stream names of binary Office files, and the first bytes of everything else.
+    `data` is bytes or a seekable binary file.
+    Returns TEXT, SPREADSHEET, PRESENTATION, DRAWING, or None if it can't tell.
+    """
+    head = inputs.read_head(data, 4096)
+    if head.startswith(b"PK\x03\x04"):
+        return _classify_zip(data)
+    if head.startswith(_OLE_MAGIC):
+        found = _find_ole_streams(data)
+        for name, document_class in _OLE_STREAMS:
+            if name in found:
+                return document_class
+        return None
+    if head.startswith(b"%PDF"):
+        # LibreOffice opens PDFs in Draw
+        return DRAWING
+    if head.startswith(b"{\\rtf"):
+        return TEXT
+
+    match = _ODF_MIMETYPE_ATTRIBUTE.search(head)
+    if match:
+        return _ODF_MIMETYPES.get(match.group(1).decode())
+    head = head.lower()
+    for marker, document_class in _XML_MARKERS:
+        if marker in head:
+            return document_class
+    return None
+
+
+def _find_ole_streams(data):
+    """The names of the entries in the root storage of a compound file
+
+    Only the header, the FAT sectors of the directory and the directory itself
+    are read, not the streams.
+    """
+    header = inputs.read_at(data, 0, 512)
+    if len(header) < 512:
+        return set()
+    sector_size = 1 << struct.unpack_from("<H", header, 0x1E)[0]
+    if sector_size not in (512, 4096):
+        return set()
+    first_directory_sector = struct.unpack_from("<I", header, 0x30)[0]
+    next_difat_sector = struct.unpack_from("<I", header, 0x44)[0]
+    fat_sectors = list(struct.unpack_from(f"<{_OLE_HEADER_FAT_SECTORS}I", header, 0x4C))
+    entries_per_sector = sector_size // 4
+    fat_cache = {}
+
+    def read_sector(sector):
+        return inputs.read_at(data, (sector + 1) * sector_size, sector_size)
+
+    def fat_sector(index):
+        # The FAT sectors after the first 109 are listed in the DIFAT chain
+        nonlocal next_difat_sector
+        while index >= len(fat_sectors) and next_difat_sector < _OLE_END_OF_CHAIN:
+            difat = read_sector(next_difat_sector)
+            if len(difat) < sector_size:
+                break
+            fat_sectors.extend(struct.unpack_from(f"<{entries_per_sector - 1}I", difat))
+            next_difat_sector = struct.unpack_from("<I", difat, sector_size - 4)[0]
+        return fat_sectors[index] if index < len(fat_sectors) else None
+
+    def next_sector(sector):
+        index, offset = divmod(sector, entries_per_sector)
+        if index not in fat_cache:
+            location = fat_sector(index)
+            if location is None or location >= _OLE_END_OF_CHAIN:
+                return _OLE_END_OF_CHAIN
+            fat_cache[index] = read_sector(location)
+        fat = fat_cache[index]
+        if len(fat) < sector_size:
+            return _OLE_END_OF_CHAIN
+        return struct.unpack_from("<I", fat, offset * 4)[0]
+
+    directory = b""
+    sector = first_directory_sector
+    for _ in range(_OLE_MAX_DIRECTORY_SECTORS):
+        if sector >= _OLE_END_OF_CHAIN:
+            break
+        chunk = read_sector(sector)
+        if len(chunk) < sector_size:
+            break
+        directory += chunk
+        sector = next_sector(sector)
+
+    def entry(index):
+        offset = index * 128
+        if offset + 128 > len(directory):
+            return None
+        name_length = struct.unpack_from("<H", directory, offset + 0x40)[0]
+        name = directory[offset:offset + max(name_length - 2, 0)].decode("utf-16-le", "replace")
+        left, right, child = struct.unpack_from("<III", directory, offset + 0x44)
+        return name, left, right, child
+
+    root = entry(0)
+    if root is None:
+        return set()
+    # The children of a storage are a tree of siblings, walk it without going into
+    # the child storages
+    names = set()
+    seen = set()
+    pending = [root[3]]
+    while pending:
+        index = pending.pop()
+        if index == _OLE_NO_STREAM or index in seen:
+            continue
+        seen.add(index)
+        found = entry(index)
+        if found is None:
+            continue
+        name, left, right, _ = found
+        names.add(name)
+        pending.extend((left, right))
+    return names
+
+
+def _classify_zip(data):
+    try:
+        with zipfile.ZipFile(data if inputs.is_file(data) else io.BytesIO(data)) as archive:
+            names = archive.namelist()
+            if "mimetype" in names:
+                mimetype = archive.read("mimetype").decode("ascii", "replace").strip()
+                prefix = "application/vnd.oasis.opendocument."
+                if mimetype.startswith(prefix):
+                    return _ODF_MIMETYPES.get(mimetype[len(prefix):])
+                return None
+    except zipfile.BadZipFile:
+        return None
+    finally:
+        if inputs.is_file(data):
+            data.seek(0)
+
+    for name in names:
+        for folder, document_class in _OOXML_FOLDERS.items():
+            if name.startswith(folder):
+                return document_class
+    return None
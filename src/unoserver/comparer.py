@@ -7,13 +7,13 @@ except ImportError:
         "it with the same Python executable as your Libreoffice installation uses."
     )
 
-import io
 import logging
 import os
-import unohelper
 
 from com.sun.star.beans import PropertyValue
-from com.sun.star.io import XOutputStream
+
+from unoserver import streams
+from unoserver.streams import OutputStream
 
 logger = logging.getLogger("unoserver")
 
@@ -42,17 +42,6 @@ def get_doc_type(doc):
     )
 
 
-class OutputStream(unohelper.Base, XOutputStream):
-    def __init__(self):
-        self.buffer = io.BytesIO()
-
-    def closeOutput(self):
-        pass
-
-    def writeBytes(self, seq):
-        self.buffer.write(seq.value)
-
-
 class UnoComparer:
     """The class that performs the comparison
 
@@ -130,6 +119,7 @@ class UnoComparer:
         newdata=None,
         outpath=None,
         filetype=None,
+        outfile=None,
     ):
         """Compare two files and convert the result from one type to another.
 
@@ -142,6 +132,9 @@ class UnoComparer:
                  the content of the converted file will be returned as a byte string.
 
         filetype: The extension of the desired file type, ie "pdf", "xlsx", etc.
+
+        outfile: Something with a write() method the result is written to, and returned,
+                 instead of returning the content.
         """
         new_props = (PropertyValue(Name="Hidden", Value=True),)
 
@@ -155,11 +148,8 @@ class UnoComparer:
             # This returned None if the file was locked, I'm hoping the ReadOnly flag avoids that.
 
         elif newdata:
-            # The document content is passed in as a byte string
-            new_stream = self.service.createInstanceWithContext(
-                "com.sun.star.io.SequenceInputStream", self.context
-            )
-            new_stream.initialize((uno.ByteSequence(newdata),))
+            # The document content is passed in as a byte string or a file object
+            new_stream = streams.make_input_stream(self.service, self.context, newdata)
             new_props += (PropertyValue(Name="InputStream", Value=new_stream),)
             newpath = "private:stream"
 
@@ -182,12 +172,9 @@ class UnoComparer:
             old_type = self.type_service.queryTypeByURL(oldpath)
 
         elif olddata:
-            # The document content is passed in as a byte string
-            old_stream = self.service.createInstanceWithContext(
-                "com.sun.star.io.SequenceInputStream", self.context
-            )
-            old_stream.initialize((uno.ByteSequence(newdata),))
-            old_props += (PropertyValue(Name="InputStream", Value=new_stream),)
+            # The document content is passed in as a byte string or a file object
+            old_stream = streams.make_input_stream(self.service, self.context, olddata)
+            old_props += (PropertyValue(Name="InputStream", Value=old_stream),)
             old_props += (PropertyValue(Name="URL", Value="private:stream"),)
             old_type = self.type_service.queryTypeByDescriptor(old_props, False)[0]
 
@@ -254,7 +241,7 @@ class UnoComparer:
                 PropertyValue(Name="Overwrite", Value=True),
             )
             if outpath is None:
-                output_stream = OutputStream()
+                output_stream = OutputStream(outfile)
                 output_props += (
                     PropertyValue(Name="OutputStream", Value=output_stream),
                 )
@@ -265,6 +252,8 @@ class UnoComparer:
             new_document.close(True)
 
         if outpath is None:
+            if outfile is not None:
+                return outfile
             return output_stream.buffer.getvalue()
         else:
             return None
@@ -0,0 +1,148 @@
+import logging
+import os
+import shlex
+import threading
+
+logger = logging.getLogger("unoserver")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+_cgroup_lock = threading.Lock()
+_cgroup_base = False  # False means not looked for yet
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _write(path, value):
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def cgroup_base():
+    """A cgroup v2 directory the workers' cgroups can be created in, or None
+
+    Controllers can only be enabled for the children of a cgroup that has no
+    processes of its own, so if the memory and cpu controllers aren't enabled
+    yet, this process is moved into an `unoserver` leaf first. It's only called
+    when there is a memory or CPU limit.
+    """
+    global _cgroup_base
+    with _cgroup_lock:
+        if _cgroup_base is not False:
+            return _cgroup_base
+        _cgroup_base = None
+        try:
+            for line in _read("/proc/self/cgroup").splitlines():
+                if line.startswith("0::"):
+                    base = os.path.join(CGROUP_ROOT, line[3:].strip().lstrip("/"))
+                    break
+            else:
+                logger.warning("No cgroup v2 hierarchy, the memory and CPU limits of LibreOffice are not applied")
+                return None
+
+            wanted = {"memory", "cpu"} & set(_read(os.path.join(base, "cgroup.controllers")).split())
+            enabled = set(_read(os.path.join(base, "cgroup.subtree_control")).split())
+            if not wanted <= enabled:
+                leaf = os.path.join(base, "unoserver")
+                os.makedirs(leaf, exist_ok=True)
+                _write(os.path.join(leaf, "cgroup.procs"), str(os.getpid()))
+                _write(os.path.join(base, "cgroup.subtree_control"), " ".join(f"+{c}" for c in sorted(wanted)))
+            _cgroup_base = base
+        except OSError as e:
+            logger.warning(f"The cgroup is not writable ({e}), the memory and CPU limits of LibreOffice are not applied")
+        return _cgroup_base
+
+
+class ResourceLimits:
+    """Hard limits for the LibreOffice processes, enforced by the kernel
+
+    memory_bytes: The memory.max of a cgroup per LibreOffice. The kernel kills
+                  LibreOffice as soon as it uses more, instead of when the next
+                  memory sample notices it. Needs a writable cgroup v2.
+
+    cpus: The cpu.max of that cgroup, in CPUs, ie 1.5.
+
+    address_space_bytes: An RLIMIT_AS for LibreOffice, which works without cgroups.
+                         It limits virtual memory, which is a lot more than the
+                         memory in use, so it should be generous.
+    """
+
+    def __init__(self, memory_bytes=None, cpus=None, address_space_bytes=None):
+        self.memory_bytes = memory_bytes
+        self.cpus = cpus
+        self.address_space_bytes = address_space_bytes
+
+    def contain(self, name):
+        return Containment(self, name)
+
+
+class Containment:
+    """The limits of one LibreOffice, applied to its process when it's started"""
+
+    def __init__(self, limits: ResourceLimits, name):
+        self.limits = limits
+        self.cgroup = None
+        if limits.memory_bytes or limits.cpus:
+            base = cgroup_base()
+            if base is not None:
+                self.cgroup = self._create_cgroup(os.path.join(base, f"unoserver-worker-{name}"))
+
+    def _create_cgroup(self, path):
+        try:
+            os.makedirs(path, exist_ok=True)
+            if self.limits.memory_bytes:
+                _write(os.path.join(path, "memory.max"), str(int(self.limits.memory_bytes)))
+                # Swapping would only make a runaway document slower, not smaller
+                if os.path.exists(os.path.join(path, "memory.swap.max")):
+                    _write(os.path.join(path, "memory.swap.max"), "0")
+            if self.limits.cpus:
+                period = 100000
+                _write(os.path.join(path, "cpu.max"), f"{int(self.limits.cpus * period)} {period}")
+            return path
+        except OSError as e:
+            logger.warning(f"Could not set up the cgroup {path}: {e}")
+            return None
+
+    def wrap(self, cmd):
+        """The command that starts `cmd` with the limits applied
+
+        A small shell applies them and then executes LibreOffice in its own place,
+        so no Python runs between fork and exec, which isn't safe in a process
+        with threads. Joining the cgroup before exec means every process
+        LibreOffice starts is in the cgroup too.
+        """
+        if os.name != "posix":
+            return cmd
+        steps = []
+        if self.limits.address_space_bytes:
+            steps.append(f"ulimit -v {int(self.limits.address_space_bytes) // 1024}")
+        if self.cgroup is not None:
+            steps.append(f"echo $$ > {shlex.quote(os.path.join(self.cgroup, 'cgroup.procs'))}")
+        if not steps:
+            return cmd
+        script = " && ".join(steps + ['exec "$@"'])
+        return ["/bin/sh", "-c", script, "unoserver-containment"] + list(cmd)
+
+    def oom_kills(self):
+        """How many processes the kernel killed in the cgroup for running out of memory"""
+        if self.cgroup is None:
+            return 0
+        try:
+            for line in _read(os.path.join(self.cgroup, "memory.events")).splitlines():
+                key, _, value = line.partition(" ")
+                if key == "oom_kill":
+                    return int(value)
+        except OSError:
+            pass
+        return 0
+
+    def remove(self):
+        if self.cgroup is not None:
+            try:
+                os.rmdir(self.cgroup)
+            except OSError:
+                # Still has processes, it will be reused by the next worker with this name
+                pass
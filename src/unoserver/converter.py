@@ -7,14 +7,19 @@ except ImportError:
         "it with the same Python executable as your Libreoffice installation uses."
     )
 
-import io
 import logging
 import os
-import unohelper
+import threading
+import time
 
 from pathlib import Path
 from com.sun.star.beans import PropertyValue
-from com.sun.star.io import XOutputStream
+from com.sun.star.connection import NoConnectException
+from com.sun.star.lang import DisposedException
+from com.sun.star.uno import RuntimeException as UnoRuntimeException
+
+from unoserver import filters, metrics, streams
+from unoserver.streams import OutputStream
 
 logger = logging.getLogger("unoserver")
 
@@ -32,10 +37,42 @@ DOC_TYPES = {
 }
 
 
+def connection_string(interface="127.0.0.1", port="2002", pipe=None):
+    """The UNO connection string, over a named pipe if `pipe` is given, else over TCP
+
+    A pipe avoids the loopback TCP stack, which matters for large documents,
+    as every document is sent through the connection as one byte sequence.
+    """
+    if pipe:
+        return f"pipe,name={pipe}"
+    return f"socket,host={interface},port={port},tcpNoDelay=1"
+
+
 def prop2dict(properties):
     return {p.Name: p.Value for p in properties}
 
 
+def is_bridge_error(error):
+    """Whether an exception means the UNO bridge to LibreOffice is gone"""
+    if isinstance(error, (DisposedException, NoConnectException)):
+        return True
+    return isinstance(error, UnoRuntimeException) and "bridge" in str(error).lower()
+
+
+def get_index_info(doc):
+    """The number of indexes, and whether there are any fields, without changing anything"""
+    try:
+        index_count = doc.getDocumentIndexes().getCount()
+    except AttributeError:
+        # The document doesn't implement the XDocumentIndexesSupplier interface
+        index_count = 0
+    try:
+        has_fields = doc.getTextFields().createEnumeration().hasMoreElements()
+    except AttributeError:
+        has_fields = False
+    return index_count, has_fields
+
+
 def get_doc_type(doc):
     for t in DOC_TYPES:
         if doc.supportsService(t):
@@ -50,31 +87,33 @@ def get_doc_type(doc):
     )
 
 
-class OutputStream(unohelper.Base, XOutputStream):
-    def __init__(self):
-        self.buffer = io.BytesIO()
-
-    def closeOutput(self):
-        pass
-
-    def writeBytes(self, seq):
-        self.buffer.write(seq.value)
-
-
 class UnoConverter:
     """The class that performs the conversion
 
     Don't use this directly, instead use the client.UnoConverter.
     """
 
-    def __init__(self, interface="127.0.0.1", port="2002"):
+    def __init__(self, interface="127.0.0.1", port="2002", pipe=None, can_reconnect=None, catalog_dir=None):
+        self.connection = connection_string(interface, port, pipe)
+        # Called before reconnecting a dropped bridge, a reconnect is only tried if it
+        # returns True, ie not when LibreOffice was killed on purpose.
+        self.can_reconnect = can_reconnect
+        self._connect_lock = threading.Lock()
         self.local_context = uno.getComponentContext()
         self.resolver = self.local_context.ServiceManager.createInstanceWithContext(
             "com.sun.star.bridge.UnoUrlResolver", self.local_context
         )
-        self.context = self.resolver.resolve(
-            f"uno:socket,host={interface},port={port};urp;StarOffice.ComponentContext"
-        )
+        self.connect()
+        self._export_filters = None
+        self._import_filters = None
+        self._version = None
+        # Where the filter catalog is saved, so it's only built once per LibreOffice version
+        self.catalog_dir = catalog_dir
+        self._catalog = None
+
+    def connect(self):
+        """Resolves the component context and the services of the running LibreOffice"""
+        self.context = self.resolver.resolve(f"uno:{self.connection};urp;StarOffice.ComponentContext")
         self.service = self.context.ServiceManager
         self.desktop = self.service.createInstanceWithContext(
             "com.sun.star.frame.Desktop", self.context
@@ -85,22 +124,106 @@ class UnoConverter:
         self.type_service = self.service.createInstanceWithContext(
             "com.sun.star.document.TypeDetection", self.context
         )
-        self._export_filters = None
-        self._import_filters = None
 
-    def find_filter(self, import_type, export_type):
-        for export_filter in self.get_available_export_filters():
-            if export_filter["DocumentService"] != import_type:
-                continue
-            if export_filter["Type"] != export_type:
-                continue
+    def reconnect(self, stale_context=None):
+        """Connects again to the same LibreOffice, after the bridge was dropped
 
-            # There is only one possible filter per import and export type,
-            # so the first one we find is correct
-            return export_filter["Name"]
+        With `stale_context`, nothing is done if another thread has already
+        reconnected since that context was in use. Raises if LibreOffice can't
+        be reached, then only a restart helps.
+        """
+        with self._connect_lock:
+            if stale_context is not None and self.context is not stale_context:
+                return
+            logger.warning("The UNO bridge was dropped, reconnecting to Libreoffice")
+            try:
+                self.connect()
+            except Exception:
+                metrics.BRIDGE_RECONNECTS.inc(outcome="failed")
+                raise
+            metrics.BRIDGE_RECONNECTS.inc(outcome="ok")
+
+    def ping(self):
+        """A cheap round trip through the UNO bridge, raises if LibreOffice doesn't answer"""
+        return self.type_service.hasByName("writer8")
+
+    def get_libreoffice_version(self):
+        """The version of the LibreOffice we are connected to, ie "7.6.4.1" """
+        if self._version is not None:
+            return self._version
+
+        config_provider = self.service.createInstanceWithContext(
+            "com.sun.star.configuration.ConfigurationProvider", self.context
+        )
+        product = config_provider.createInstanceWithArguments(
+            "com.sun.star.configuration.ConfigurationAccess",
+            (PropertyValue(Name="nodepath", Value="/org.openoffice.Setup/Product"),),
+        )
+        self._version = product.getByName("ooSetupVersionAboutBox")
+        return self._version
 
-        # No filter found
-        return None
+    def update_indexes(self, document):
+        """Refreshes the fields and updates the indexes of a document, if it has any
+
+        Finding out is cheap, the refresh isn't, and most documents have neither.
+        Returns "updated" or "skipped", the time it took is in the metrics.
+        """
+        start = time.monotonic()
+        index_count, has_fields = get_index_info(document)
+        action = "skipped"
+        if index_count or has_fields:
+            try:
+                # Fields need one refresh. Indexes need two passes: the first one
+                # updates the Table-of-Contents, which grows, so the page numbers
+                # grow too. The second one updates the page numbers in the ToC.
+                for ii in range(2 if index_count else 1):
+                    document.refresh()
+                    if index_count:
+                        indexes = document.getDocumentIndexes()
+                        for i in range(0, indexes.getCount()):
+                            indexes.getByIndex(i).update()
+                action = "updated"
+            except AttributeError:
+                # The document doesn't implement the XRefreshable interface
+                pass
+        duration = time.monotonic() - start
+        metrics.INDEX_UPDATE_SECONDS.observe(duration, action=action)
+        logger.info(
+            f"Index update {action} in {duration:.3f}s ({index_count} indexes, "
+            f"{'with' if has_fields else 'no'} fields)"
+        )
+        return action
+
+    def get_filter_catalog(self):
+        """The index of the filters and types, see filters.FilterCatalog"""
+        if self._catalog is None:
+            self._catalog = filters.get_catalog(
+                self.get_libreoffice_version(), self.catalog_dir, self.build_filter_catalog
+            )
+        return self._catalog
+
+    def build_filter_catalog(self):
+        # Ask TypeDetection for the type of every known extension once, the same
+        # way convert() used to for every conversion
+        extensions = set()
+        for type_name in self.type_service.getElementNames():
+            type_props = prop2dict(self.type_service.getByName(type_name))
+            extensions.update(ext.lower() for ext in type_props.get("Extensions") or () if ext and ext != "*")
+        type_by_extension = {}
+        for extension in sorted(extensions):
+            export_type = self.type_service.queryTypeByURL(f"file:///dummy.{extension}")
+            if export_type:
+                type_by_extension[extension] = export_type
+
+        return filters.FilterCatalog(
+            self.get_libreoffice_version(),
+            self.get_available_import_filters(),
+            self.get_available_export_filters(),
+            type_by_extension,
+        )
+
+    def find_filter(self, import_type, export_type):
+        return self.get_filter_catalog().find_export_filter(import_type, export_type)
 
     def get_available_import_filters(self):
         # Doing this call for some reason uses up memory each time, so we do it
@@ -138,22 +261,56 @@ class UnoConverter:
 
         return self._export_filters
 
-    def get_filter_names(self, filters):
-        names = {}
-        for flt in filters:
-            # Add all names and exstensions, etc in a mapping to the internal
-            # Libreoffice name, so we can map it.
-            # The actual name:
-            names[flt["Name"]] = flt["Name"]
-            # UserData sometimes has file extensions, etc.
-            # Skip empty data, and those weird file paths, and "true"...
-            for name in filter(
-                lambda x: x and x != "true" and "." not in x, flt["UserData"]
-            ):
-                names[name] = flt["Name"]
-        return names
-
-    def convert(
+    def get_filter_names(self, filters_list):
+        return filters.filter_names(filters_list)
+
+    def convert(self, *args, **kwargs):
+        """Converts a file from one type to another
+
+        If the UNO bridge was dropped, it's reconnected and the conversion is
+        tried once more. See _convert() for the arguments.
+        """
+        return self._retry_on_bridge_error(self._convert, [kwargs.get("outfile")], *args, **kwargs)
+
+    def convert_many(self, inpath=None, indata=None, targets=(), update_index=True, infiltername=None):
+        """Loads a document once, and exports it once for each target
+
+        targets: A list of dicts, each with the outpath, convert_to, filtername,
+                 filter_options and outfile arguments of _convert() for one export.
+
+        Loading and laying out the document is what takes the time, so this is a
+        lot faster than a conversion per target. Returns the result of each
+        target, in order, like convert() does.
+        """
+        for target in targets:
+            if not target.get("outpath") and not target.get("convert_to"):
+                raise ValueError(f"Every target needs an outpath or a convert_to, not {target}")
+        outfiles = [target.get("outfile") for target in targets]
+        return self._retry_on_bridge_error(
+            self._convert_many, outfiles, inpath, indata, targets, update_index, infiltername
+        )
+
+    def _retry_on_bridge_error(self, function, outfiles, *args, **kwargs):
+        context = self.context
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if not is_bridge_error(e) or (self.can_reconnect is not None and not self.can_reconnect()):
+                raise
+            self.reconnect(context)
+            logger.info("Reconnected to Libreoffice, retrying the conversion")
+            for outfile in outfiles:
+                if outfile is None:
+                    continue
+                # Part of the result may already be written
+                if hasattr(outfile, "reset"):
+                    outfile.reset()
+                else:
+                    outfile.seek(0)
+                    outfile.truncate()
+            return function(*args, **kwargs)
+
+    def _convert(
         self,
         inpath=None,
         indata=None,
@@ -163,12 +320,14 @@ class UnoConverter:
         filter_options=[],
         update_index=True,
         infiltername=None,
+        outfile=None,
     ):
         """Converts a file from one type to another
 
         inpath: A path (on the local hard disk) to a file to be converted.
 
-        indata: A byte string containing the file content to be converted.
+        indata: A byte string containing the file content to be converted, or a seekable
+                binary file with the content, which is read in chunks.
 
         outpath: A path (on the local hard disk) to store the result, or None, in which case
                  the content of the converted file will be returned as a byte string.
@@ -183,11 +342,46 @@ class UnoConverter:
 
         infiltername: The name of the input filter, ie "writer8", "PowerPoint 3", etc.
 
+        outfile: Something with a write() method, ie a file or an outputs.SpooledOutput, that
+                 the result is written to as LibreOffice produces it. It's returned instead
+                 of the content, which then never is in memory as a whole.
+
         You must specify the inpath or the indata, and you must specify and outpath or a convert_to.
         """
+        document = self._load(inpath, indata, infiltername)
+        try:
+            if update_index:
+                self.update_indexes(document)
+            return self._export(document, outpath, convert_to, filtername, filter_options, infiltername, outfile)
+        finally:
+            document.close(True)
+
+    def _convert_many(self, inpath, indata, targets, update_index, infiltername):
+        document = self._load(inpath, indata, infiltername)
+        try:
+            if update_index:
+                self.update_indexes(document)
+            results = []
+            for target in targets:
+                results.append(
+                    self._export(
+                        document,
+                        target.get("outpath"),
+                        target.get("convert_to"),
+                        target.get("filtername"),
+                        target.get("filter_options", []),
+                        infiltername,
+                        target.get("outfile"),
+                    )
+                )
+            return results
+        finally:
+            document.close(True)
+
+    def _load(self, inpath, indata, infiltername):
         input_props = (PropertyValue(Name="ReadOnly", Value=True),)
         if infiltername:
-            infilters = self.get_filter_names(self.get_available_import_filters())
+            infilters = self.get_filter_catalog().import_aliases
             if infiltername in infilters:
                 input_props += (
                     PropertyValue(Name="FilterName", Value=infilters[infiltername]),
@@ -209,13 +403,10 @@ class UnoConverter:
             import_path = uno.systemPathToFileUrl(os.path.abspath(inpath))
 
         elif indata:
-            # The document content is passed in as a byte string
+            # The document content is passed in as a byte string or a file object
             logger.info("Opening private:stream for input")
-            old_stream = self.service.createInstanceWithContext(
-                "com.sun.star.io.SequenceInputStream", self.context
-            )
-            old_stream.initialize((uno.ByteSequence(indata),))
-            input_props += (PropertyValue(Name="InputStream", Value=old_stream),)
+            input_stream = streams.make_input_stream(self.service, self.context, indata)
+            input_props += (PropertyValue(Name="InputStream", Value=input_stream),)
             import_path = "private:stream"
 
         document = self.desktop.loadComponentFromURL(
@@ -233,34 +424,21 @@ class UnoConverter:
             logger.error(error)
             raise RuntimeError(error)
 
-        if update_index:
-            # Update document indexes
-            for ii in range(2):
-                # At first, update Table-of-Contents.
-                # ToC grows, so page numbers grow too.
-                # On second turn, update page numbers in ToC.
-                try:
-                    document.refresh()
-                    indexes = document.getDocumentIndexes()
-                except AttributeError:
-                    # The document doesn't implement the XRefreshable and/or
-                    # XDocumentIndexesSupplier interfaces
-                    break
-                else:
-                    for i in range(0, indexes.getCount()):
-                        indexes.getByIndex(i).update()
+        return document
 
-        # Now do the conversion
-        try:
-            # Figure out document type:
-            import_type = get_doc_type(document)
+    def _export(self, document, outpath, convert_to, filtername, filter_options, infiltername, outfile):
+        # Figure out document type:
+        import_type = get_doc_type(document)
 
-            if outpath:
-                export_path = uno.systemPathToFileUrl(os.path.abspath(outpath))
-            else:
-                export_path = "private:stream"
+        if outpath:
+            export_path = uno.systemPathToFileUrl(os.path.abspath(outpath))
+        else:
+            export_path = "private:stream"
 
-            # Figure out the output type:
+        # Figure out the output type, from the catalog if the extension is in it:
+        extension = convert_to or os.path.splitext(outpath)[-1]
+        export_type = self.get_filter_catalog().export_type(extension)
+        if not export_type:
             if convert_to:
                 export_type = self.type_service.queryTypeByURL(
                     f"file:///dummy.{convert_to}"
@@ -268,89 +446,86 @@ class UnoConverter:
             else:
                 export_type = self.type_service.queryTypeByURL(export_path)
 
-            if not export_type:
-                if convert_to:
-                    extension = convert_to
-                else:
-                    extension = os.path.splitext(outpath)[-1]
+        if not export_type:
+            if convert_to:
+                extension = convert_to
+            else:
+                extension = os.path.splitext(outpath)[-1]
+            raise RuntimeError(
+                f"Unknown export file type, unknown extension '{extension}'"
+            )
+
+        if filtername is not None:
+            available_filter_names = self.get_filter_catalog().export_aliases
+            if filtername not in available_filter_names:
                 raise RuntimeError(
-                    f"Unknown export file type, unknown extension '{extension}'"
+                    f"There is no '{filtername}' export-filter. Available filters: {sorted(available_filter_names)}"
                 )
-
-            if filtername is not None:
-                available_filter_names = self.get_filter_names(
-                    self.get_available_export_filters()
+        else:
+            filtername = self.find_filter(import_type, export_type)
+            if filtername is None:
+                raise RuntimeError(
+                    f"Could not find an export filter from {import_type} to {export_type}"
                 )
-                if filtername not in available_filter_names:
-                    raise RuntimeError(
-                        f"There is no '{filtername}' export-filter. Available filters: {sorted(available_filter_names)}"
-                    )
-            else:
-                filtername = self.find_filter(import_type, export_type)
-                if filtername is None:
-                    raise RuntimeError(
-                        f"Could not find an export filter from {import_type} to {export_type}"
-                    )
-
-            logger.info(f"Exporting to {outpath}")
-            logger.info(
-                f"Using {filtername} export filter from {infiltername} to {export_type}"
-            )
 
-            export_filter_data = []
-            export_filter_options = []
+        logger.info(f"Exporting to {outpath}")
+        logger.info(
+            f"Using {filtername} export filter from {infiltername} to {export_type}"
+        )
 
-            for option in filter_options:
-                if "=" in option:
-                    option_name, option_value = option.split("=", maxsplit=1)
-                else:
-                    option_name = None
-                    option_value = option
-
-                if option_value == "false":
-                    option_value = False
-                elif option_value == "true":
-                    option_value = True
-                elif option_value.isdecimal():
-                    option_value = int(option_value)
-
-                if option_name is not None:
-                    export_filter_data.append(
-                        PropertyValue(Name=option_name, Value=option_value)
-                    )
-                else:
-                    export_filter_options.append(
-                        PropertyValue(Name="FilterOptions", Value=option_value)
-                    )
+        export_filter_data = []
+        export_filter_options = []
 
-            output_props = (
-                PropertyValue(Name="FilterName", Value=filtername),
-                PropertyValue(Name="Overwrite", Value=True),
-            )
-            if outpath is None:
-                output_stream = OutputStream()
-                output_props += (
-                    PropertyValue(Name="OutputStream", Value=output_stream),
+        for option in filter_options:
+            if "=" in option:
+                option_name, option_value = option.split("=", maxsplit=1)
+            else:
+                option_name = None
+                option_value = option
+
+            if option_value == "false":
+                option_value = False
+            elif option_value == "true":
+                option_value = True
+            elif option_value.isdecimal():
+                option_value = int(option_value)
+
+            if option_name is not None:
+                export_filter_data.append(
+                    PropertyValue(Name=option_name, Value=option_value)
                 )
-            if export_filter_data:
-                output_props += (
-                    PropertyValue(
-                        Name="FilterData",
-                        Value=uno.Any(
-                            "[]com.sun.star.beans.PropertyValue",
-                            tuple(export_filter_data),
-                        ),
-                    ),
+            else:
+                export_filter_options.append(
+                    PropertyValue(Name="FilterOptions", Value=option_value)
                 )
-            if export_filter_options:
-                output_props += tuple(export_filter_options)
 
-            document.storeToURL(export_path, output_props)
+        output_props = (
+            PropertyValue(Name="FilterName", Value=filtername),
+            PropertyValue(Name="Overwrite", Value=True),
+        )
+        if outpath is None:
+            output_stream = OutputStream(outfile)
+            output_props += (
+                PropertyValue(Name="OutputStream", Value=output_stream),
+            )
+        if export_filter_data:
+            output_props += (
+                PropertyValue(
+                    Name="FilterData",
+                    Value=uno.Any(
+                        "[]com.sun.star.beans.PropertyValue",
+                        tuple(export_filter_data),
+                    ),
+                ),
+            )
+        if export_filter_options:
+            output_props += tuple(export_filter_options)
 
-        finally:
-            document.close(True)
+        document.storeToURL(export_path, output_props)
 
         if outpath is None:
+            if outfile is not None:
+                return outfile
             return output_stream.buffer.getvalue()
         else:
             return None
@@ -0,0 +1,55 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("unoserver")
+
+
+class Drainer:
+    """Shuts the server down without losing the work it has already accepted
+
+    Once started, `draining` is set so no new work is accepted, and `pending`,
+    a function returning the counts of the work still going on by kind, is
+    polled until everything is done or `grace_period` seconds have passed.
+    Then `shutdown` is called.
+    """
+
+    def __init__(self, grace_period, pending, shutdown, interval=1.0):
+        self.grace_period = grace_period
+        self.pending = pending
+        self.shutdown = shutdown
+        self.interval = interval
+        self.draining = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts draining in the background, so it can be called from a signal handler"""
+        with self._lock:
+            if self.draining:
+                return
+            self.draining = True
+        logger.info(f"Draining, waiting up to {self.grace_period}s for the accepted work to finish")
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        start = time.monotonic()
+        deadline = start + self.grace_period
+        while True:
+            counts = self.pending()
+            if not any(counts.values()):
+                logger.info(f"Drained in {time.monotonic() - start:.1f}s")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"The grace period ran out, abandoning {self._describe(counts)}")
+                break
+            logger.info(f"Draining: {self._describe(counts)} left, {remaining:.0f}s until shutdown")
+            time.sleep(min(self.interval, remaining))
+
+        try:
+            self.shutdown()
+        except Exception:
+            logger.exception("Shutting down after draining failed")
+
+    def _describe(self, counts):
+        return ", ".join(f"{count} {kind}" for kind, count in counts.items() if count)
@@ -1,3 +1,26 @@
 class UnoServerException(Exception):
     pass
 
+
+class QueueFullException(UnoServerException):
+    """The admission queue is full, the request should be retried later"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueTimeoutException(QueueFullException):
+    """The request waited in the admission queue for too long"""
+
+
+class ConversionTimeoutException(UnoServerException):
+    """The conversion ran past its deadline and was cancelled"""
+
+
+class LibreOfficeCrashedException(UnoServerException):
+    """LibreOffice died during the conversion, ie it was killed for running out of memory"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
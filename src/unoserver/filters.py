@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger("unoserver")
+
+# Only these properties of a filter are kept, the others are not JSON safe and not needed
+FILTER_PROPERTIES = ("Name", "UIName", "Type", "DocumentService", "UserData", "Flags")
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def filter_names(filters):
+    """A mapping of every name a filter is known by to its LibreOffice name"""
+    names = {}
+    for flt in filters:
+        # Add all names and exstensions, etc in a mapping to the internal
+        # Libreoffice name, so we can map it.
+        # The actual name:
+        names[flt["Name"]] = flt["Name"]
+        # UserData sometimes has file extensions, etc.
+        # Skip empty data, and those weird file paths, and "true"...
+        for name in filter(lambda x: x and x != "true" and "." not in x, flt["UserData"] or ()):
+            names[name] = flt["Name"]
+    return names
+
+
+def _json_safe(value):
+    if isinstance(value, (tuple, list)):
+        return [_json_safe(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class FilterCatalog:
+    """The filters and types of one LibreOffice version, indexed for lookups
+
+    Resolving the filter of a conversion with the catalog needs no calls to
+    LibreOffice. It's built once per LibreOffice version, saved as a small JSON
+    file, and loaded from there by every later process.
+    """
+
+    def __init__(self, version, import_filters, export_filters, type_by_extension):
+        self.version = version
+        self.import_filters = [
+            {key: _json_safe(flt.get(key)) for key in FILTER_PROPERTIES} for flt in import_filters
+        ]
+        self.export_filters = [
+            {key: _json_safe(flt.get(key)) for key in FILTER_PROPERTIES} for flt in export_filters
+        ]
+        self.type_by_extension = dict(type_by_extension)
+
+        self.import_aliases = filter_names(self.import_filters)
+        self.export_aliases = filter_names(self.export_filters)
+        self.export_by_service_type = {}
+        for flt in self.export_filters:
+            # The filters are sorted, the first one for an import and export type is correct
+            self.export_by_service_type.setdefault((flt["DocumentService"], flt["Type"]), flt["Name"])
+
+    def export_type(self, extension):
+        """The type of files with an extension, or None if it's not known"""
+        extension = extension.lstrip(".")
+        return self.type_by_extension.get(extension) or self.type_by_extension.get(extension.lower())
+
+    def find_export_filter(self, document_service, export_type):
+        return self.export_by_service_type.get((document_service, export_type))
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "import_filters": self.import_filters,
+            "export_filters": self.export_filters,
+            "type_by_extension": self.type_by_extension,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["version"], data["import_filters"], data["export_filters"], data["type_by_extension"])
+
+    @staticmethod
+    def snapshot_path(directory, version):
+        safe_version = "".join(c if c.isalnum() or c in ".-" else "_" for c in str(version))
+        return os.path.join(directory, f"filters-{safe_version}.json")
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = self.snapshot_path(directory, self.version)
+        # Write to a temporary file first, so other processes never read half a snapshot
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as snapshot:
+                json.dump(self.to_dict(), snapshot)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, directory, version):
+        """The saved catalog of a version, or None if there is none, or it can't be read"""
+        path = cls.snapshot_path(directory, version)
+        try:
+            with open(path) as snapshot:
+                return cls.from_dict(json.load(snapshot))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring the broken filter catalog {path}: {e}")
+            return None
+
+
+def get_catalog(version, directory, build):
+    """The catalog of a LibreOffice version, from memory, from the snapshot in `directory`,
+    or made by calling `build`, in that order
+    """
+    with _catalogs_lock:
+        catalog = _catalogs.get(version)
+        if catalog is not None:
+            return catalog
+
+        if directory is not None:
+            catalog = FilterCatalog.load(directory, version)
+        if catalog is None:
+            catalog = build()
+            logger.info(f"Built the filter catalog of Libreoffice {version}")
+            if directory is not None:
+                try:
+                    catalog.save(directory)
+                except OSError as e:
+                    logger.warning(f"Could not save the filter catalog in {directory}: {e}")
+        _catalogs[version] = catalog
+        return catalog
@@ -0,0 +1,66 @@
+"""Documents to convert are bytes, or seekable binary files that are read in chunks
+
+A file is always read from the start, and left at the start, so it can be
+read again, ie by a retry.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_file(source):
+    return hasattr(source, "read")
+
+
+def input_size(source):
+    if not is_file(source):
+        return len(source)
+    source.seek(0, 2)
+    size = source.tell()
+    source.seek(0)
+    return size
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    if not is_file(source):
+        # Slicing a memoryview doesn't copy
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+        return
+    source.seek(0)
+    try:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        source.seek(0)
+
+
+def read_head(source, size):
+    if not is_file(source):
+        return bytes(source[:size])
+    source.seek(0)
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+
+def read_at(source, offset, size):
+    if not is_file(source):
+        return bytes(source[offset:offset + size])
+    source.seek(offset)
+    data = source.read(size)
+    source.seek(0)
+    return data
+
+
+def read_all(source):
+    """The whole document as bytes, only for the places that can't do without"""
+    if not is_file(source):
+        return source
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
@@ -0,0 +1,210 @@
+import glob
+import logging
+import math
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from unoserver.exceptions import QueueFullException, QueueTimeoutException
+
+logger = logging.getLogger("unoserver")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, job_id, filename, input_path, options):
+        self.id = job_id
+        self.filename = filename
+        self.input_path = input_path
+        self.output_path = None
+        self.options = options
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        info = {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.started is not None:
+            info["queued_seconds"] = self.started - self.created
+        if self.finished is not None:
+            info["running_seconds"] = self.finished - self.started
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """Runs conversions in the background
+
+    The input and the output of every job are spooled to `spool_dir`, so the
+    memory use doesn't grow with the number of waiting jobs. Finished jobs, and
+    their files, are removed `ttl` seconds after they finished. At most
+    `max_queued` jobs wait at the same time, more are rejected with a
+    QueueFullException. A job that can't get into the conversion queue within
+    `max_wait` seconds fails.
+    """
+
+    def __init__(
+        self, service, spool_dir=None, ttl=3600, workers=1, cleanup_interval=60, max_queued=None, max_wait=None
+    ):
+        self.service = service
+        if spool_dir is None:
+            spool_dir = tempfile.mkdtemp(prefix="unoserver-jobs-")
+        os.makedirs(spool_dir, exist_ok=True)
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._queued = 0
+        self._average_duration = None
+
+        self._remove_leftovers()
+
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+        threading.Thread(target=self._cleanup, daemon=True).start()
+
+    def _remove_leftovers(self):
+        # The jobs of an earlier process are gone with it, and so is any way to fetch them
+        leftovers = glob.glob(os.path.join(self.spool_dir, "*.in")) + glob.glob(
+            os.path.join(self.spool_dir, "*.out")
+        )
+        for path in leftovers:
+            self._unlink(path)
+        if leftovers:
+            logger.info(f"Removed {len(leftovers)} files of earlier jobs from {self.spool_dir}")
+
+    def retry_after(self):
+        """A guess of how many seconds it takes until there is room in the queue"""
+        duration = self._average_duration or 1.0
+        return max(1, math.ceil(duration * self._queued / self.workers))
+
+    def submit(self, fileobj, filename=None, **options) -> Job:
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.spool_dir, f"{job_id}.in")
+        job = Job(job_id, filename, input_path, options)
+        with self._lock:
+            if self.max_queued is not None and self._queued >= self.max_queued:
+                raise QueueFullException("The job queue is full", self.retry_after())
+            self._queued += 1
+            self._jobs[job_id] = job
+
+        try:
+            with open(input_path, "wb") as spooled:
+                shutil.copyfileobj(fileobj, spooled)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+                del self._jobs[job_id]
+            self._unlink(input_path)
+            raise
+        self._queue.put(job)
+        logger.info(f"Queued job {job_id} for {filename}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._queued -= 1
+            job.status = RUNNING
+            job.started = time.time()
+            try:
+                # LibreOffice reads the spooled input in chunks
+                with open(job.input_path, "rb") as spooled:
+                    result = self._convert(spooled, job.filename, job.options)
+                if result is None:
+                    raise RuntimeError("Conversion failed")
+
+                output_path = os.path.join(self.spool_dir, f"{job.id}.out")
+                result.save_to(output_path)
+                job.output_path = output_path
+                job.status = DONE
+            except Exception as e:
+                logger.exception(f"Job {job.id} failed")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished = time.time()
+                self._unlink(job.input_path)
+                duration = job.finished - job.started
+                if self._average_duration is None:
+                    self._average_duration = duration
+                else:
+                    self._average_duration = 0.9 * self._average_duration + 0.1 * duration
+            logger.info(f"Job {job.id} {job.status} in {job.finished - job.started:.2f}s")
+
+    def _convert(self, data, filename, options):
+        # A background job can wait, so a full queue means trying again later,
+        # until it waited for `max_wait` seconds
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        while True:
+            try:
+                return self.service.convert_output(data, filename=filename, **options)
+            except QueueFullException as e:
+                delay = e.retry_after
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise QueueTimeoutException("Timed out waiting in the conversion queue", e.retry_after) from e
+                    delay = min(delay, remaining)
+                data.seek(0)
+                time.sleep(delay)
+
+    def _cleanup(self):
+        while True:
+            time.sleep(self.cleanup_interval)
+            now = time.time()
+            with self._lock:
+                expired = [
+                    job
+                    for job in self._jobs.values()
+                    if job.finished is not None and now - job.finished > self.ttl
+                ]
+                for job in expired:
+                    del self._jobs[job.id]
+            for job in expired:
+                if job.output_path:
+                    self._unlink(job.output_path)
+            if expired:
+                logger.info(f"Removed {len(expired)} expired jobs")
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -6,19 +6,21 @@ import sys
 sys.path.append("/usr/lib/python3/dist-packages")
 sys.path.append("/usr/lib/libreoffice/program")
 
+import itertools
 import logging
 import os
 import shutil
-import psutil
 import signal
+import socket
 import subprocess
 import threading
 import time
 import platform
 
 
-from unoserver import converter
-from unoserver.exceptions import UnoServerException
+from unoserver import converter, inputs, metrics, profile, warmup
+from unoserver.memory import MemorySampler
+from unoserver.exceptions import ConversionTimeoutException, LibreOfficeCrashedException, UnoServerException
 
 from com.sun.star.uno import Exception as UnoException
 
@@ -29,6 +31,51 @@ __version__ = "Byon"
 logger = logging.getLogger("unoserver")
 
 
+class DeadlineWatchdog:
+    """Cancels conversions that run past their deadline
+
+    Only the server running the late conversion is recycled, conversions on
+    other servers are not affected.
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._deadlines = {}
+        self._thread = None
+
+    def watch(self, server, deadline, token):
+        """Cancels the conversion `token` of `server` if it's still running at `deadline`"""
+        with self._lock:
+            self._deadlines[server] = (deadline, token)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def unwatch(self, server):
+        with self._lock:
+            self._deadlines.pop(server, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    (server, token) for server, (deadline, token) in self._deadlines.items() if deadline <= now
+                ]
+                for server, _ in expired:
+                    del self._deadlines[server]
+            for server, token in expired:
+                try:
+                    server.cancel_conversion(token)
+                except Exception:
+                    logger.exception(f"Could not cancel the conversion on port {server.uno_port}")
+
+
+watchdog = DeadlineWatchdog()
+
+
 class UnoServer:
     def __init__(
         self,
@@ -37,11 +84,57 @@ class UnoServer:
         user_installation=None,
         conversion_timeout=None,
         memory_usage_ratio_limit=6.0,
+        install_signal_handlers=True,
+        profile_template=None,
+        startup_timeout=60,
+        recycle_policy=None,
+        heartbeat_interval=5,
+        probe_interval=1.0,
+        probe_timeout=0.5,
+        uno_transport="socket",
+        uno_pipe_name=None,
+        warmup=False,
+        resource_limits=None,
+        filter_catalog_dir=None,
     ):
         self.uno_interface = uno_interface
         self.uno_port = uno_port
+        # With the "pipe" transport the UNO connection goes over a named pipe, and
+        # uno_port is only the name of the server, nothing listens on it.
+        if uno_transport not in ("socket", "pipe"):
+            raise ValueError(f"Unknown UNO transport {uno_transport!r}, use 'socket' or 'pipe'")
+        self.uno_transport = uno_transport
+        if uno_transport == "pipe":
+            self.uno_pipe_name = uno_pipe_name or f"unoserver-{os.getpid()}-{uno_port}"
+        else:
+            self.uno_pipe_name = None
         self.user_installation = user_installation
         self.conversion_timeout = conversion_timeout
+        self.profile_template = profile_template
+        self.startup_timeout = startup_timeout
+        self.time_to_ready = None
+        # Convert sample documents before the server is used, see warmup.warm_up()
+        self.warmup = warmup
+        self.warmup_seconds = None
+        self.first_conversion_seconds = None
+        self.recycle_policy = recycle_policy
+        # Usage of the current LibreOffice process, for the recycle policy
+        self.conversions_since_start = 0
+        self.input_bytes_since_start = 0
+        self.memory_sampler = MemorySampler(name=str(uno_port))
+        # Kernel enforced limits, see containment.ResourceLimits
+        self.containment = resource_limits.contain(str(uno_port)) if resource_limits is not None else None
+        self._oom_kills_at_start = 0
+        self.last_activity = None
+        self.heartbeat_interval = heartbeat_interval
+        # The UNO bridge probe, see probe_bridge()
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe_thread: threading.Thread = None
+        self.bridge_latency = None
+        self.bridge_state = "unknown"
+        self._ping_thread: threading.Thread = None
+        self.filter_catalog_dir = filter_catalog_dir
         self.libreoffice_process = None
         self.intentional_exit = False
         self.converter_instance = None
@@ -51,6 +144,20 @@ class UnoServer:
         self.is_libreoffice_started = False
         self.is_server_stopped = True
         self.heartbeat_thread: threading.Thread = None
+        self.conversion_count = 0
+        self.libreoffice_version = None
+        # Called with (server, reason) instead of killing LibreOffice in place, so a
+        # pool can swap in a standby instance and drain this one in the background.
+        self.on_recycle = None
+        # Set when the server is taken out of use for good, which ends the heartbeat
+        self.is_retired = False
+        self._deadline_exceeded = False
+        # Identifies the running conversion, so the watchdog never cancels the next one
+        self._conversion_tokens = itertools.count(1)
+        self._conversion_token = None
+        self._cancel_lock = threading.Lock()
+        self._recycle_lock = threading.Lock()
+        self._recycled_process = None
 
         self.executable = None
         for name in ("soffice", "libreoffice", "ooffice"):
@@ -62,11 +169,14 @@ class UnoServer:
         else:
             self.executable = executable
 
-        signal.signal(signal.SIGTERM, self.signal_handler)
-        signal.signal(signal.SIGINT, self.signal_handler)
-        # Signal SIGHUP is available only in Unix systems
-        if platform.system() != "Windows":
-            signal.signal(signal.SIGHUP, self.signal_handler)
+        # A pool of servers installs its own handlers and forwards the signals
+        # to each of its workers, so they must not override each other here.
+        if install_signal_handlers:
+            signal.signal(signal.SIGTERM, self.signal_handler)
+            signal.signal(signal.SIGINT, self.signal_handler)
+            # Signal SIGHUP is available only in Unix systems
+            if platform.system() != "Windows":
+                signal.signal(signal.SIGHUP, self.signal_handler)
 
         # The memory usage ratio limit makes sure that if the libreoffice process exceeds
         # its initial memory usage by that multiplier it will be killed.
@@ -80,10 +190,29 @@ class UnoServer:
                 logger.debug("The UnoServer is already started")
                 return
 
+            start = time.monotonic()
+            self.conversions_since_start = 0
+            self.input_bytes_since_start = 0
+            self.memory_sampler.clear()
+            self.last_activity = None
             self.start_libreoffice(executable)
             self.start_unoconverter()
+            self.libreoffice_version = self.converter_instance.get_libreoffice_version()
+            self.first_conversion_seconds = None
+            if self.warmup:
+                warmup_start = time.monotonic()
+                timings = warmup.warm_up(self.converter_instance)
+                self.warmup_seconds = time.monotonic() - warmup_start
+                logger.info(
+                    f"Libreoffice on port {self.uno_port} warmed up in {self.warmup_seconds:.2f}s: "
+                    + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+                )
             self.is_server_stopped = False
 
+            self.time_to_ready = time.monotonic() - start
+            metrics.STARTUP_SECONDS.observe(self.time_to_ready)
+            logger.info(f"Libreoffice on port {self.uno_port} ready in {self.time_to_ready:.2f}s")
+
             self._libreoffice_initial_ram_usage = self.get_libreoffice_ram_usage()
             logger.info(f"Initial Libreoffice RAM usage: {int(self._libreoffice_initial_ram_usage / (1024**2))}mb")
 
@@ -91,7 +220,15 @@ class UnoServer:
                 self.heartbeat_thread = threading.Thread(target=self.heartbeat)
                 self.heartbeat_thread.start()
 
+            if self.probe_interval and (not self.probe_thread or not self.probe_thread.is_alive()):
+                self.probe_thread = threading.Thread(target=self.probe, daemon=True)
+                self.probe_thread.start()
+
     def signal_handler(self, signum, frame):
+        self.send_signal(signum)
+        exit()
+
+    def send_signal(self, signum):
         self.intentional_exit = True
         logger.info("Sending signal to LibreOffice")
         try:
@@ -103,7 +240,14 @@ class UnoServer:
             # 3 means the process is already dead
             if e.errno != 3:
                 raise
-        exit()
+
+    def shutdown(self):
+        """Stops LibreOffice for good, waiting for it to exit cleanly"""
+        self.intentional_exit = True
+        self.is_server_stopped = True
+        self.kill_libreoffice()
+        if self.containment is not None:
+            self.containment.remove()
 
     def start_libreoffice(self, executable="libreoffice"):
         if self.is_libreoffice_started:
@@ -112,9 +256,15 @@ class UnoServer:
 
         logger.info(f"Starting unoserver {__version__}.")
 
+        if self.profile_template and self.user_installation:
+            # Starting from an already initialised profile saves LibreOffice from creating one
+            template = profile.ensure_profile_template(executable, self.profile_template)
+            if template is not None:
+                profile.seed_user_installation(self.user_installation, template)
+
         connection = (
-            "socket,host=%s,port=%s,tcpNoDelay=1;urp;StarOffice.ComponentContext"
-            % (self.uno_interface, self.uno_port)
+            converter.connection_string(self.uno_interface, self.uno_port, self.uno_pipe_name)
+            + ";urp;StarOffice.ComponentContext"
         )
 
         # I think only --headless and --norestore are needed for
@@ -132,51 +282,114 @@ class UnoServer:
             f"--accept={connection}",
         ]
 
+        if self.containment is not None:
+            self._oom_kills_at_start = self.containment.oom_kills()
+            cmd = self.containment.wrap(cmd)
         logger.info("Command: " + " ".join(cmd))
         self.libreoffice_process = subprocess.Popen(cmd)
-        time.sleep(5)
+        # Notices an exit the moment it happens, instead of at the next heartbeat
+        threading.Thread(target=self.wait_for_exit, args=(self.libreoffice_process,), daemon=True).start()
+        self.wait_for_accept()
         self.is_libreoffice_started = True
 
         return self.libreoffice_process
 
+    def wait_for_accept(self, interval=0.05):
+        """Waits until LibreOffice accepts connections, instead of sleeping for a fixed time"""
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.libreoffice_process.poll() is not None:
+                raise UnoServerException(
+                    f"Libreoffice exited with code {self.libreoffice_process.returncode} while starting"
+                )
+            if self.uno_pipe_name is not None:
+                if self._pipe_accepts():
+                    return
+                time.sleep(interval)
+                continue
+            try:
+                with socket.create_connection((self.uno_interface, int(self.uno_port)), timeout=interval):
+                    return
+            except OSError:
+                time.sleep(interval)
+
+        self.libreoffice_process.terminate()
+        raise UnoServerException(f"Libreoffice did not accept connections within {self.startup_timeout}s")
+
+    def _pipe_accepts(self):
+        # On Unix a LibreOffice pipe is a Unix socket with this name in /tmp, or
+        # /var/tmp. Elsewhere, just let start_unoconverter() retry until it connects.
+        if not hasattr(socket, "AF_UNIX"):
+            return True
+        name = f"OSL_PIPE_{os.getuid()}_{self.uno_pipe_name}"
+        for directory in ("/tmp", "/var/tmp"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(os.path.join(directory, name))
+                    return True
+                except OSError:
+                    continue
+        return False
+
+    def wait_for_exit(self, process):
+        process.wait()
+        if process is not self.libreoffice_process or self.is_server_stopped or self.intentional_exit:
+            # Killed on purpose, or it died while starting, which start() reports
+            return
+        reason, description = self.describe_exit(process)
+        logger.warning(f"Libreoffice on port {self.uno_port} {description}, recycling it")
+        self.is_libreoffice_started = False
+        self.recycle(reason)
+
+    def describe_exit(self, process):
+        """Why LibreOffice exited, as a (reason, description) tuple"""
+        returncode = process.returncode
+        if self.containment is not None and self.containment.oom_kills() > self._oom_kills_at_start:
+            return "oom", "was killed for going over its memory limit"
+        if returncode == -signal.SIGKILL:
+            return "oom", "was killed with SIGKILL, most likely for running out of memory"
+        if returncode is not None and returncode < 0:
+            return "crash", f"was killed by {signal.Signals(-returncode).name}"
+        return "crash", f"exited with code {returncode}"
+
     def get_libreoffice_ram_usage(self):
+        """The memory used by LibreOffice and its children, the PSS if available, else the RSS"""
         if not self.is_libreoffice_started:
             raise RuntimeError("Cannot check memory of unstarted process")
-        libreoffice_pid = self.libreoffice_process.pid
+        return self.memory_sampler.measure(self.libreoffice_process.pid).used
 
-        parent = psutil.Process(libreoffice_pid)
-        children = parent.children(recursive=True)
+    @property
+    def memory_samples(self):
+        return self.memory_sampler.samples
 
-        total_rss = parent.memory_info().rss  # bytes
-        for child in children:
-            try:
-                total_rss += child.memory_info().rss
-            except psutil.NoSuchProcess:
-                continue  # Child exited during iteration?
-
-        return total_rss
+    @property
+    def is_busy(self):
+        return self._libreoffice_lock.locked()
 
     def start_unoconverter(self):
         logger.info(f"Starting UnoConverter instance.")
-        attempts = 20
-        while attempts > 0:
+        # LibreOffice already accepts connections, so this normally succeeds at once.
+        # If not, poll at short intervals until the startup timeout runs out.
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
             try:
                 self.converter_instance = converter.UnoConverter(
-                    interface=self.uno_interface, port=self.uno_port
+                    interface=self.uno_interface,
+                    port=self.uno_port,
+                    pipe=self.uno_pipe_name,
+                    can_reconnect=self.can_reconnect,
+                    catalog_dir=self.filter_catalog_dir,
                 )
                 break
             except UnoException as e:
                 # A connection refused just means it hasn't started yet:
-                if "Connection refused" in str(e):
+                if "Connection refused" in str(e) or "couldn't connect to pipe" in str(e):
                     logger.debug("Libreoffice is not yet started")
-                    time.sleep(2)
-                    attempts -= 1
+                    time.sleep(0.1)
                     continue
                 # This is a different error
                 logger.warning("Error when starting UnoConverter, retrying: %s", e)
-                # These kinds of errors can be retried fewer times
-                attempts -= 4
-                time.sleep(5)
+                time.sleep(0.5)
                 continue
         else:
             # We ran out of attempts
@@ -187,6 +400,15 @@ class UnoServer:
 
         logger.info("UnoConverter started")
 
+    def can_reconnect(self):
+        """A dropped bridge is only worth reconnecting while LibreOffice is running normally"""
+        return (
+            not self.is_server_stopped
+            and not self._deadline_exceeded
+            and self.libreoffice_process is not None
+            and self.libreoffice_process.poll() is None
+        )
+
     def kill_libreoffice(self):
         if self.libreoffice_process is not None:
             logger.info("Sending SIGTERM to libreoffice")
@@ -212,31 +434,256 @@ class UnoServer:
         except:
             logger.exception("Conversion failed")
 
-    def convert_to_pdf(self, file_content: bytes) -> bytes:
+    def convert(
+        self,
+        file_content,
+        convert_to="pdf",
+        filtername=None,
+        filter_options=(),
+        update_index=True,
+        infiltername=None,
+        timeout=None,
+        outfile=None,
+    ) -> bytes:
+        """Converts a document, cancelling the conversion after `timeout` seconds
+
+        The document is bytes, or a seekable binary file, which LibreOffice reads
+        in chunks, so it's never in memory as a whole. With `outfile`, the result is
+        written to it, and it's returned instead of the bytes.
+
+        The timeout defaults to the conversion_timeout of the server. A cancelled
+        conversion raises a ConversionTimeoutException, and LibreOffice is recycled.
+        """
+        return self._run_conversion(
+            file_content,
+            timeout,
+            lambda: self.converter_instance.convert(
+                indata=file_content,
+                convert_to=convert_to,
+                filtername=filtername,
+                filter_options=list(filter_options),
+                update_index=update_index,
+                infiltername=infiltername,
+                outfile=outfile,
+            ),
+        )
+
+    def convert_many(self, file_content, targets, update_index=True, infiltername=None, timeout=None) -> list:
+        """Loads a document once, and exports it once for each target
+
+        The targets are dicts with the convert_to, filtername, filter_options and
+        outfile of one export, see UnoConverter.convert_many(). The timeout is for
+        the whole lot. Returns the result of each target, in order.
+        """
+        targets = [dict(target, filter_options=list(target.get("filter_options", ()))) for target in targets]
+        return self._run_conversion(
+            file_content,
+            timeout,
+            lambda: self.converter_instance.convert_many(
+                indata=file_content,
+                targets=targets,
+                update_index=update_index,
+                infiltername=infiltername,
+            ),
+        )
+
+    def _run_conversion(self, file_content, timeout, conversion):
         if not self.is_libreoffice_started:
             self.start()
 
-        try:
-            with self._libreoffice_lock:
-                return self.converter_instance.convert(indata=file_content, convert_to="pdf")
-        except:
-            logger.exception("Conversion failed")
+        if timeout is None:
+            timeout = self.conversion_timeout
+
+        start = time.monotonic()
+        with self._libreoffice_lock:
+            metrics.WAIT_SECONDS.observe(time.monotonic() - start, stage="lock")
+            self.conversion_count += 1
+            self.conversions_since_start += 1
+            self.input_bytes_since_start += inputs.input_size(file_content)
+            self._deadline_exceeded = False
+            process = self.libreoffice_process
+            first_conversion = self.conversions_since_start == 1
+            conversion_start = time.monotonic()
+            with self._cancel_lock:
+                token = self._conversion_token = next(self._conversion_tokens)
+            if timeout:
+                watchdog.watch(self, time.monotonic() + timeout, token)
+            try:
+                result = conversion()
+                if first_conversion:
+                    self.first_conversion_seconds = time.monotonic() - conversion_start
+                    metrics.FIRST_CONVERSION_SECONDS.observe(
+                        self.first_conversion_seconds, warmed_up=str(bool(self.warmup)).lower()
+                    )
+                    logger.info(
+                        f"First conversion on port {self.uno_port} since the start took "
+                        f"{self.first_conversion_seconds:.2f}s"
+                    )
+                return result
+            except Exception as e:
+                if self._deadline_exceeded:
+                    raise ConversionTimeoutException(f"The conversion took longer than {timeout}s") from e
+                if converter.is_bridge_error(e) and not self.intentional_exit:
+                    # The bridge goes down a moment before the process is gone
+                    try:
+                        process.wait(timeout=1)
+                    except subprocess.TimeoutExpired:
+                        pass
+                    if process.returncode is not None:
+                        reason, description = self.describe_exit(process)
+                        raise LibreOfficeCrashedException(
+                            f"Libreoffice {description} during the conversion", reason
+                        ) from e
+                logger.exception("Conversion failed")
+                raise
+            finally:
+                with self._cancel_lock:
+                    self._conversion_token = None
+                self.last_activity = time.monotonic()
+                if timeout:
+                    watchdog.unwatch(self)
+
+    def cancel_conversion(self, token):
+        with self._cancel_lock:
+            if token != self._conversion_token:
+                # That conversion finished in the meantime
+                return
+            logger.warning(f"The conversion on port {self.uno_port} ran past its deadline, killing libreoffice")
+            self._deadline_exceeded = True
+            # Killing LibreOffice makes the blocked conversion call fail at once
+            self.recycle("timeout")
+
+    def convert_to_pdf(self, file_content: bytes) -> bytes:
+        return self.convert(file_content, convert_to="pdf")
+
+    @property
+    def memory_usage_threshold(self):
+        return self._libreoffice_initial_ram_usage * self.memory_usage_ratio_limit
+
+    def recycle(self, reason):
+        """Kills LibreOffice, or hands it to on_recycle, and returns True
+
+        The heartbeat, the probe, the exit waiter and the watchdog can all notice
+        the same exit, only the first one recycles a LibreOffice process. The
+        others get False.
+        """
+        with self._recycle_lock:
+            process = self.libreoffice_process
+            if process is None or process is self._recycled_process:
+                return False
+            self._recycled_process = process
+            self.is_server_stopped = True
+        metrics.LIBREOFFICE_RESTARTS.inc(reason=reason)
+        if self.on_recycle is not None:
+            self.on_recycle(self, reason)
+        else:
+            self.kill_libreoffice()
+        return True
+
+    def check_health(self):
+        """Returns the reason LibreOffice should be recycled, or None if it's fine
+
+        This doesn't take the conversion lock, so it never waits for a conversion.
+        """
+        if self.libreoffice_process.poll() is not None:
+            reason, description = self.describe_exit(self.libreoffice_process)
+            logger.info(f"Libreoffice {description}")
+            self.is_libreoffice_started = False
+            return reason
+
+        sample = self.memory_sampler.sample(self.libreoffice_process.pid)
+        memory_usage_threshold = self.memory_usage_threshold
+        if sample.used > memory_usage_threshold:
+            memory_usage_threshold_mb = int(memory_usage_threshold / (1024 ** 2))
+            logger.info(f"Libreoffice uses more than {memory_usage_threshold_mb}mb of RAM, killing it.")
+            return "memory"
+
+        if self.recycle_policy is not None:
+            decision = self.recycle_policy.check(self)
+            if decision is not None:
+                reason, details = decision
+                logger.info(f"Recycling Libreoffice on port {self.uno_port}: {reason}, {details}")
+                return reason
+        return None
+
+    @property
+    def is_ready(self):
+        return not self.is_server_stopped and self.bridge_state in ("ok", "busy")
+
+    @property
+    def is_alive(self):
+        return self.is_server_stopped or self.bridge_state in ("ok", "busy", "unknown")
+
+    def probe_bridge(self):
+        """Makes a round trip call through the UNO bridge, and measures its latency
+
+        The call runs in a separate thread, so a hung bridge is noticed after
+        probe_timeout, not when the call returns. Sets bridge_state to "ok", "busy"
+        (slow while converting, which can be normal), "unresponsive" or "dead".
+        """
+        if self._ping_thread is not None and self._ping_thread.is_alive():
+            # The previous ping still hasn't returned
+            self.bridge_state = "busy" if self.is_busy else "unresponsive"
+            return self.bridge_state
+
+        outcome = {}
+        converter_instance = self.converter_instance
+
+        def ping():
+            try:
+                converter_instance.ping()
+                outcome["ok"] = True
+            except Exception as e:
+                outcome["error"] = e
+
+        start = time.monotonic()
+        self._ping_thread = threading.Thread(target=ping, daemon=True)
+        self._ping_thread.start()
+        self._ping_thread.join(self.probe_timeout)
+        latency = time.monotonic() - start
+
+        if "ok" in outcome:
+            self.bridge_latency = latency
+            self.bridge_state = "ok"
+            metrics.BRIDGE_LATENCY_SECONDS.observe(latency)
+        elif "error" in outcome:
+            logger.warning(f"The UNO bridge on port {self.uno_port} failed: {outcome['error']}")
+            self.bridge_state = "dead"
+        else:
+            self.bridge_state = "busy" if self.is_busy else "unresponsive"
+        return self.bridge_state
+
+    def probe(self):
+        logger.debug(f"Bridge probe thread #{threading.get_ident()} started")
+        while not self.intentional_exit and not self.is_retired:
+            if not self.is_server_stopped and self.converter_instance is not None:
+                context = self.converter_instance.context
+                state = self.probe_bridge()
+                if state == "dead" and self.can_reconnect():
+                    # Often only the bridge dropped, reconnecting is much faster than a restart
+                    try:
+                        self.converter_instance.reconnect(context)
+                        state = self.probe_bridge()
+                    except Exception as e:
+                        logger.warning(f"Could not reconnect to Libreoffice on port {self.uno_port}: {e}")
+                if state == "dead" or (state == "unresponsive" and not self.is_busy):
+                    logger.info(f"The UNO bridge on port {self.uno_port} is {state}, recycling libreoffice")
+                    self.recycle(state)
+            time.sleep(self.probe_interval)
 
     def heartbeat(self):
+        # Hung conversions are handled by the deadline watchdog, the heartbeat
+        # only looks for crashes and memory growth.
         logger.debug(f"Heartbeat thread #{threading.get_ident()} started")
-        while not self.is_server_stopped:
-            is_acquired = self._libreoffice_lock.acquire(timeout=self.conversion_timeout)
-            if not is_acquired:
-                logger.info("Heartbeat failed, killing libreoffice")
-                self.kill_libreoffice()
-                self.is_server_stopped = True
-            else:
-                memory_usage_threshold = self._libreoffice_initial_ram_usage * self.memory_usage_ratio_limit
-                if self.get_libreoffice_ram_usage() > memory_usage_threshold:
-                    memory_usage_threshold_mb = int(memory_usage_threshold / (1024 ** 2))
-                    logger.info(f"Libreoffice uses more than {memory_usage_threshold_mb}mb of RAM, killing it.")
-                    self.kill_libreoffice()
-                    self.is_server_stopped = True
-
-                self._libreoffice_lock.release()
-                time.sleep(5)
+        while not self.intentional_exit and not self.is_retired:
+            if not self.is_server_stopped:
+                reason = self.check_health()
+                if reason == "crash" or (reason is not None and self.on_recycle is not None):
+                    # A pool drains the server itself before it's killed
+                    self.recycle(reason)
+                elif reason is not None:
+                    # Don't kill LibreOffice in the middle of a conversion
+                    with self._libreoffice_lock:
+                        if not self.is_server_stopped:
+                            self.recycle(reason)
+            time.sleep(self.heartbeat_interval)
@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+from collections import deque, namedtuple
+
+import psutil
+
+from unoserver import metrics
+
+logger = logging.getLogger("unoserver")
+
+# All sizes are in bytes. `used` is what the limits are checked against: the
+# PSS when it can be read, which doesn't count shared pages once per process.
+MemorySample = namedtuple("MemorySample", ["time", "rss", "pss", "uss", "used"])
+
+_SMAPS_FIELDS = {
+    b"Rss:": "rss",
+    b"Pss:": "pss",
+    b"Private_Clean:": "uss",
+    b"Private_Dirty:": "uss",
+    b"Private_Hugetlb:": "uss",
+}
+
+
+def read_smaps_rollup(pid):
+    """Reads the RSS, PSS and USS of one process from /proc/<pid>/smaps_rollup
+
+    Returns None if the file can't be read, ie on other systems than Linux.
+    """
+    totals = {"rss": 0, "pss": 0, "uss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "rb") as rollup:
+            for line in rollup:
+                parts = line.split()
+                field = _SMAPS_FIELDS.get(parts[0]) if parts else None
+                if field is not None:
+                    totals[field] += int(parts[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    return totals
+
+
+def _proc_children(pid):
+    # Needs CONFIG_PROC_CHILDREN, raises FileNotFoundError without it
+    children = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children", "rb") as child_list:
+            children.extend(int(child) for child in child_list.read().split())
+    return children
+
+
+def process_tree(pid):
+    """The pid and the pids of all its descendants"""
+    try:
+        pids = [pid]
+        for parent in pids:
+            pids.extend(_proc_children(parent))
+        return pids
+    except FileNotFoundError:
+        pass
+    try:
+        return [pid] + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return []
+
+
+class MemorySampler:
+    """Samples the memory use of a process tree into a ring buffer
+
+    It reads /proc directly and doesn't need any lock of the server, so sampling
+    never waits for, or holds up, a conversion.
+    """
+
+    def __init__(self, name, history=60):
+        self.name = name
+        self.samples = deque(maxlen=history)
+        self.last_duration = None
+
+    def clear(self):
+        self.samples.clear()
+
+    @property
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def measure(self, pid):
+        rss = pss = uss = 0
+        have_smaps = True
+        for member in process_tree(pid):
+            totals = read_smaps_rollup(member)
+            if totals is None:
+                have_smaps = False
+                try:
+                    rss += psutil.Process(member).memory_info().rss
+                except psutil.NoSuchProcess:
+                    continue  # Child exited during iteration?
+            else:
+                rss += totals["rss"]
+                pss += totals["pss"]
+                uss += totals["uss"]
+        if not have_smaps:
+            # Without smaps_rollup, fall back to summing RSS
+            pss = uss = None
+        return MemorySample(time.monotonic(), rss, pss, uss, pss if pss is not None else rss)
+
+    def sample(self, pid):
+        start = time.perf_counter()
+        sample = self.measure(pid)
+        self.last_duration = time.perf_counter() - start
+        self.samples.append(sample)
+
+        metrics.MEMORY_SAMPLE_SECONDS.observe(self.last_duration)
+        metrics.LIBREOFFICE_RSS_BYTES.set(sample.rss, worker=self.name)
+        if sample.pss is not None:
+            metrics.LIBREOFFICE_PSS_BYTES.set(sample.pss, worker=self.name)
+            metrics.LIBREOFFICE_USS_BYTES.set(sample.uss, worker=self.name)
+        return sample
@@ -0,0 +1,226 @@
+"""A small Prometheus text-format metrics registry
+
+Recording a value is a dictionary lookup and an addition under a lock, so it's
+cheap enough to leave on under full load. Counters and gauges can also be
+backed by a function that is only called when the metrics are scraped.
+"""
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """The base of all metrics
+
+    Instead of recording values, a counter or gauge can be backed by `function`,
+    which is called when the metrics are scraped. Without labels it returns a
+    number, with labels a dictionary from tuples of label values to numbers.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        if self.function is not None:
+            values = self.function()
+            if not self.labelnames:
+                values = {(): values}
+            return [(self.name, tuple(str(v) for v in key), (), value) for key, value in values.items()]
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, plus +Inf, plus the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), counts[-1]))
+            samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric called {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def unregister(self, metric):
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONVERSION_SECONDS = Histogram(
+    "unoserver_conversion_seconds",
+    "Time to answer a conversion request.",
+    ["input_type", "outcome"],
+)
+WAIT_SECONDS = Histogram(
+    "unoserver_wait_seconds",
+    "Time a conversion waited before it could run, in the admission queue, for a worker, or for the LibreOffice lock.",
+    ["stage"],
+)
+INPUT_BYTES = Counter("unoserver_input_bytes_total", "Bytes of documents received for conversion.")
+OUTPUT_BYTES = Counter("unoserver_output_bytes_total", "Bytes of converted documents returned.")
+QUEUE_DEPTH = Gauge(
+    "unoserver_queue_depth",
+    "Conversions in the admission queue of a worker group, waiting or in flight.",
+    ["group", "state"],
+)
+LIBREOFFICE_RSS_BYTES = Gauge(
+    "unoserver_libreoffice_rss_bytes",
+    "Memory used by the LibreOffice process of a worker.",
+    ["worker"],
+)
+LIBREOFFICE_RESTARTS = Counter(
+    "unoserver_libreoffice_restarts_total",
+    "LibreOffice processes that were killed or died, by reason.",
+    ["reason"],
+)
+STARTUP_SECONDS = Histogram(
+    "unoserver_libreoffice_startup_seconds",
+    "Time from starting a LibreOffice process until it's ready for conversions.",
+)
+LIBREOFFICE_PSS_BYTES = Gauge(
+    "unoserver_libreoffice_pss_bytes",
+    "Proportional set size of the LibreOffice process of a worker, shared pages divided between processes.",
+    ["worker"],
+)
+LIBREOFFICE_USS_BYTES = Gauge(
+    "unoserver_libreoffice_uss_bytes",
+    "Memory used only by the LibreOffice process of a worker.",
+    ["worker"],
+)
+MEMORY_SAMPLE_SECONDS = Histogram(
+    "unoserver_memory_sample_seconds",
+    "Time taken to sample the memory use of a LibreOffice process.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+BRIDGE_LATENCY_SECONDS = Histogram(
+    "unoserver_bridge_latency_seconds",
+    "Round trip time of a probe call through the UNO bridge.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+FIRST_CONVERSION_SECONDS = Histogram(
+    "unoserver_first_conversion_seconds",
+    "Time of the first conversion after LibreOffice was started, with or without a warm-up.",
+    ["warmed_up"],
+)
+BRIDGE_RECONNECTS = Counter(
+    "unoserver_bridge_reconnects_total",
+    "Reconnects of a dropped UNO bridge to a running LibreOffice, by outcome.",
+    ["outcome"],
+)
+ROUTED_CONVERSIONS = Counter(
+    "unoserver_routed_conversions_total",
+    "Conversions routed to a worker group, by detected document class.",
+    ["document_class", "group"],
+)
+INDEX_UPDATE_SECONDS = Histogram(
+    "unoserver_index_update_seconds",
+    "Time spent refreshing the fields and indexes of a document before exporting it, by whether it had any.",
+    ["action"],
+)
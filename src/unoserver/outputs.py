@@ -0,0 +1,106 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+CHUNK_SIZE = 256 * 1024
+
+
+class SpooledOutput:
+    """Collects a converted document, in memory up to `threshold` bytes, else in a temporary file
+
+    It's written like a file. Once written, any number of readers can each `open()`
+    it or iterate over its chunks, so a result shared by coalesced requests is
+    read independently.
+    The temporary file is removed when the output is no longer used.
+    """
+
+    def __init__(self, threshold=8 * 1024 * 1024, directory=None):
+        self.threshold = threshold
+        self.directory = directory
+        self.size = 0
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._path = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, data):
+        output = cls(threshold=len(data))
+        output.write(data)
+        return output
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def write(self, data):
+        with self._lock:
+            if self._file is None and self.size + len(data) > self.threshold:
+                self._spill()
+            (self._file or self._buffer).write(data)
+            self.size += len(data)
+        return len(data)
+
+    def _spill(self):
+        fd, self._path = tempfile.mkstemp(prefix="unoserver-output-", dir=self.directory)
+        weakref.finalize(self, _unlink, self._path)
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def reset(self):
+        """Throws away what was written, ie before the conversion is tried again"""
+        with self._lock:
+            if self._file is not None:
+                self._file.seek(0)
+                self._file.truncate()
+            else:
+                self._buffer = io.BytesIO()
+            self.size = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def open(self):
+        """A new binary file to read the whole output from"""
+        self.flush()
+        if self._path is not None:
+            return open(self._path, "rb")
+        return io.BytesIO(self._buffer.getbuffer())
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        with self.open() as output:
+            while True:
+                chunk = output.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def save_to(self, path):
+        """Writes the output to `path`, a spilled output is linked there instead of copied"""
+        self.flush()
+        if self._path is not None:
+            try:
+                os.link(self._path, path)
+                return
+            except OSError:
+                # Another file system, or one without hard links
+                pass
+        with self.open() as output, open(path, "wb") as saved:
+            shutil.copyfileobj(output, saved)
+
+    def getvalue(self):
+        with self.open() as output:
+            return output.read()
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,399 @@
+from __future__ import annotations
+
+import logging
+import os
+import platform
+import shutil
+import signal
+import threading
+import time
+from pathlib import Path
+
+from unoserver import metrics, profile
+from unoserver.libreoffice_uno_server import UnoServer
+from unoserver.exceptions import UnoServerException
+
+logger = logging.getLogger("unoserver")
+
+# A worker recycled for one of these will never finish its conversion, so it's
+# killed at once. For every other reason the conversion is allowed to finish.
+URGENT_RECYCLE_REASONS = ("timeout", "crash", "oom", "dead")
+# A worker that fails to restart is tried again after this many seconds, doubling
+# up to RESTART_BACKOFF_MAX
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+
+class UnoServerPool:
+    """A pool of LibreOffice workers
+
+    Each worker is a separate UnoServer with its own soffice process, port and
+    user installation, so conversions on different workers run in parallel.
+
+    With `standby` enabled, one extra worker is kept started in the background.
+    When a worker has to be recycled the standby takes its place at once, and
+    the old worker finishes its current conversion before it's killed, so the
+    recycling never happens in the path of a request.
+    """
+
+    def __init__(
+        self,
+        size=None,
+        uno_interface="127.0.0.1",
+        uno_port_base=2002,
+        user_installation_root=None,
+        conversion_timeout=None,
+        memory_usage_ratio_limit=6.0,
+        profile_template=None,
+        standby=False,
+        recycle_policy=None,
+        probe_interval=1.0,
+        probe_timeout=0.5,
+        uno_transport="socket",
+        warmup=False,
+        install_signal_handlers=True,
+        resource_limits=None,
+        filter_catalog_dir=None,
+    ):
+        if size is None:
+            size = os.cpu_count() or 1
+        if size < 1:
+            raise ValueError("The pool size must be at least 1")
+        if user_installation_root is None:
+            raise ValueError("The pool needs a root directory for the user installations")
+
+        self.size = size
+        self.uno_interface = uno_interface
+        self.uno_port_base = int(uno_port_base)
+        self.user_installation_root = user_installation_root
+        self.conversion_timeout = conversion_timeout
+        self.memory_usage_ratio_limit = memory_usage_ratio_limit
+        self.profile_template = profile_template
+        self.standby = standby
+        self.recycle_policy = recycle_policy
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        # With pipes the "ports" are only names of the workers, nothing listens on them
+        self.uno_transport = uno_transport
+        self.warmup = warmup
+        self.resource_limits = resource_limits
+        self.filter_catalog_dir = filter_catalog_dir
+        self.executable = "libreoffice"
+
+        self._dispatch_condition = threading.Condition()
+        self._busy_workers = set()
+        self._free_ports = []
+        self._next_port = self.uno_port_base
+        self._worker_generation = 0
+        self._standby_worker = None
+        self._standby_starting = False
+        self._draining_workers = set()
+        # Workers whose LibreOffice is being killed and started again, nothing else may use them
+        self._restarting_workers = set()
+        self._is_shut_down = False
+
+        self.workers = [self._create_worker() for _ in range(size)]
+
+        # Several pools behind a router leave the signals to the router
+        if install_signal_handlers:
+            signal.signal(signal.SIGTERM, self.signal_handler)
+            signal.signal(signal.SIGINT, self.signal_handler)
+            # Signal SIGHUP is available only in Unix systems
+            if platform.system() != "Windows":
+                signal.signal(signal.SIGHUP, self.signal_handler)
+
+    def _create_worker(self) -> UnoServer:
+        with self._dispatch_condition:
+            if self._free_ports:
+                port = self._free_ports.pop()
+            else:
+                port = self._next_port
+                self._next_port += 1
+            generation = self._worker_generation
+            self._worker_generation += 1
+
+        # Every soffice needs its own profile, two instances can not share one.
+        user_installation = Path(self.user_installation_root, f"worker-{generation}").as_uri()
+        worker = UnoServer(
+            uno_interface=self.uno_interface,
+            uno_port=str(port),
+            user_installation=user_installation,
+            conversion_timeout=self.conversion_timeout,
+            memory_usage_ratio_limit=self.memory_usage_ratio_limit,
+            install_signal_handlers=False,
+            profile_template=self.profile_template,
+            recycle_policy=self.recycle_policy,
+            probe_interval=self.probe_interval,
+            probe_timeout=self.probe_timeout,
+            uno_transport=self.uno_transport,
+            warmup=self.warmup,
+            resource_limits=self.resource_limits,
+            filter_catalog_dir=self.filter_catalog_dir,
+        )
+        worker.on_recycle = self._recycle_worker
+        return worker
+
+    @property
+    def is_server_stopped(self):
+        return all(worker.is_server_stopped for worker in self.workers)
+
+    @property
+    def is_ready(self):
+        return any(worker.is_ready for worker in self.workers)
+
+    @property
+    def is_alive(self):
+        return any(worker.is_alive for worker in self.workers)
+
+    def worker_status(self):
+        return [
+            {
+                "port": worker.uno_port,
+                "stopped": worker.is_server_stopped,
+                "busy": worker.is_busy,
+                "bridge": worker.bridge_state,
+                "bridge_latency": worker.bridge_latency,
+                "time_to_ready": worker.time_to_ready,
+                "warmup_seconds": worker.warmup_seconds,
+                "first_conversion_seconds": worker.first_conversion_seconds,
+                "conversions": worker.conversions_since_start,
+            }
+            for worker in self.workers
+        ]
+
+    @property
+    def libreoffice_version(self):
+        for worker in self.workers:
+            if worker.libreoffice_version is not None:
+                return worker.libreoffice_version
+        return None
+
+    def start(self, executable="libreoffice"):
+        self.executable = executable
+        # Starting LibreOffice takes a while, so start all the workers at once.
+        errors = []
+
+        def start_worker(worker):
+            try:
+                worker.start(executable)
+            except Exception as e:
+                logger.exception(f"Could not start worker on port {worker.uno_port}")
+                errors.append(e)
+
+        threads = [threading.Thread(target=start_worker, args=(worker,)) for worker in self.workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if len(errors) == len(self.workers):
+            raise UnoServerException("Could not start any LibreOffice worker, exiting.")
+        logger.info(f"Started {len(self.workers) - len(errors)} of {len(self.workers)} LibreOffice workers")
+
+        if self.standby:
+            self._start_standby()
+
+    def _all_workers(self):
+        with self._dispatch_condition:
+            workers = list(self.workers) + list(self._draining_workers)
+            if self._standby_worker is not None:
+                workers.append(self._standby_worker)
+        return workers
+
+    def signal_handler(self, signum, frame):
+        self.send_signal(signum)
+        exit()
+
+    def send_signal(self, signum):
+        for worker in self._all_workers():
+            worker.send_signal(signum)
+
+    def shutdown(self):
+        """Stops all the workers, without interrupting the signal handlers or the process"""
+        with self._dispatch_condition:
+            self._is_shut_down = True
+            # Wakes up restarts that wait to try again
+            self._dispatch_condition.notify_all()
+        workers = self._all_workers()
+        logger.info(f"Shutting down {len(workers)} LibreOffice workers")
+        threads = [threading.Thread(target=worker.shutdown) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.info("All LibreOffice workers are shut down")
+
+    def _start_standby(self):
+        with self._dispatch_condition:
+            if self._is_shut_down:
+                return
+            if self._standby_worker is not None or self._standby_starting:
+                return
+            self._standby_starting = True
+        threading.Thread(target=self._boot_standby, daemon=True).start()
+
+    def _boot_standby(self):
+        worker = self._create_worker()
+        try:
+            worker.start(self.executable)
+        except Exception:
+            logger.exception("Could not start the standby LibreOffice")
+            self._discard_worker(worker)
+            with self._dispatch_condition:
+                self._standby_starting = False
+            return
+
+        logger.info(f"Standby LibreOffice on port {worker.uno_port} is ready")
+        with self._dispatch_condition:
+            self._standby_starting = False
+            if not self._is_shut_down:
+                self._standby_worker = worker
+                return
+        worker.shutdown()
+
+    def _recycle_worker(self, worker: UnoServer, reason):
+        """Replaces a worker that needs recycling with the standby
+
+        This is called from the heartbeat of the worker or the deadline watchdog,
+        so it must not block.
+        """
+        with self._dispatch_condition:
+            if worker is self._standby_worker:
+                # The standby itself went bad before it was ever used
+                self._standby_worker = None
+                replacement = None
+            elif worker in self.workers and self._standby_worker is not None:
+                replacement = self._standby_worker
+                self._standby_worker = None
+                self.workers[self.workers.index(worker)] = replacement
+                self._draining_workers.add(worker)
+                self._dispatch_condition.notify_all()
+            else:
+                replacement = None
+
+        if replacement is not None:
+            logger.info(
+                f"Recycling LibreOffice on port {worker.uno_port} ({reason}), "
+                f"standby on port {replacement.uno_port} took its place"
+            )
+            drain = reason not in URGENT_RECYCLE_REASONS
+            threading.Thread(target=self._retire_worker, args=(worker, drain), daemon=True).start()
+        elif worker in self.workers:
+            # No standby is ready, restart the worker in place, once it's idle
+            logger.info(f"Recycling LibreOffice on port {worker.uno_port} ({reason}), no standby ready")
+            drain = reason not in URGENT_RECYCLE_REASONS
+            threading.Thread(target=self._restart_worker, args=(worker, drain), daemon=True).start()
+        else:
+            self._discard_worker(worker)
+
+        if self.standby:
+            self._start_standby()
+
+    def _restart_worker(self, worker: UnoServer, drain):
+        with self._dispatch_condition:
+            # Keep new conversions off the worker until it's restarted. An urgent restart
+            # doesn't wait for the current conversion, it's failing anyway.
+            self._restarting_workers.add(worker)
+            if drain:
+                while worker in self._busy_workers:
+                    self._dispatch_condition.wait()
+        try:
+            worker.kill_libreoffice()
+            delay = RESTART_BACKOFF
+            while self._may_restart(worker):
+                try:
+                    worker.start(self.executable)
+                    return
+                except Exception:
+                    logger.exception(f"Could not restart LibreOffice on port {worker.uno_port}, trying again in {delay:.0f}s")
+                self._wait_unless_shut_down(delay)
+                delay = min(delay * 2, RESTART_BACKOFF_MAX)
+        finally:
+            with self._dispatch_condition:
+                self._restarting_workers.discard(worker)
+                # Requests waiting for a started worker can have this one now
+                self._dispatch_condition.notify_all()
+
+    def _may_restart(self, worker: UnoServer):
+        with self._dispatch_condition:
+            return not self._is_shut_down and worker in self.workers
+
+    def _wait_unless_shut_down(self, seconds):
+        deadline = time.monotonic() + seconds
+        with self._dispatch_condition:
+            while not self._is_shut_down:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._dispatch_condition.wait(remaining)
+
+    def _retire_worker(self, worker: UnoServer, drain):
+        if drain:
+            with self._dispatch_condition:
+                while worker in self._busy_workers:
+                    self._dispatch_condition.wait()
+            logger.info(f"LibreOffice on port {worker.uno_port} is drained")
+        self._discard_worker(worker)
+
+    def _discard_worker(self, worker: UnoServer):
+        with self._dispatch_condition:
+            if worker.is_retired:
+                return
+            worker.is_retired = True
+        worker.is_server_stopped = True
+        worker.kill_libreoffice()
+        if worker.containment is not None:
+            worker.containment.remove()
+        shutil.rmtree(profile.user_installation_path(worker.user_installation), ignore_errors=True)
+        # The port goes to a new worker, which sets its own memory gauges
+        for gauge in (metrics.LIBREOFFICE_RSS_BYTES, metrics.LIBREOFFICE_PSS_BYTES, metrics.LIBREOFFICE_USS_BYTES):
+            gauge.remove(worker=worker.memory_sampler.name)
+        with self._dispatch_condition:
+            self._draining_workers.discard(worker)
+            self._free_ports.append(int(worker.uno_port))
+
+    def acquire_worker(self) -> UnoServer:
+        """Waits for an idle worker and reserves it
+
+        Of the idle workers, the least loaded one (the one that has done the fewest
+        conversions) is picked, which spreads the memory growth over the pool.
+        A worker that is being restarted is never used. Any other stopped worker is
+        only used when no worker is started, it would have to start LibreOffice first.
+        """
+        with self._dispatch_condition:
+            while True:
+                available = [worker for worker in self.workers if worker not in self._restarting_workers]
+                candidates = [worker for worker in available if not worker.is_server_stopped] or available
+                idle_workers = [worker for worker in candidates if worker not in self._busy_workers]
+                if idle_workers:
+                    worker = min(idle_workers, key=lambda w: w.conversion_count)
+                    self._busy_workers.add(worker)
+                    return worker
+                self._dispatch_condition.wait()
+
+    def release_worker(self, worker: UnoServer):
+        with self._dispatch_condition:
+            self._busy_workers.discard(worker)
+            # Wake up everybody, a draining worker may be waiting for this one too
+            self._dispatch_condition.notify_all()
+
+    def convert(self, file_content, **options) -> bytes:
+        start = time.monotonic()
+        worker = self.acquire_worker()
+        metrics.WAIT_SECONDS.observe(time.monotonic() - start, stage="worker")
+        try:
+            return worker.convert(file_content, **options)
+        finally:
+            self.release_worker(worker)
+
+    def convert_many(self, file_content, targets, **options) -> list:
+        start = time.monotonic()
+        worker = self.acquire_worker()
+        metrics.WAIT_SECONDS.observe(time.monotonic() - start, stage="worker")
+        try:
+            return worker.convert_many(file_content, targets, **options)
+        finally:
+            self.release_worker(worker)
+
+    def convert_to_pdf(self, file_content: bytes) -> bytes:
+        return self.convert(file_content, convert_to="pdf")
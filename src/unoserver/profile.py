@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger("unoserver")
+
+_template_lock = threading.Lock()
+# Templates that could not be built, they are not tried again by every new instance
+_failed_templates = set()
+
+
+def user_installation_path(user_installation):
+    """The local path of a UserInstallation, which LibreOffice takes as a file URL"""
+    if user_installation.startswith("file:"):
+        return unquote(urlparse(user_installation).path)
+    return user_installation
+
+
+def _executable_key(executable):
+    """Identifies the LibreOffice installation, by the path and modification time of its executable"""
+    path = os.path.realpath(shutil.which(executable) or executable)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = 0
+    return hashlib.sha256(f"{path}:{mtime}".encode()).hexdigest()[:16]
+
+
+def _remove_other_templates(parent_dir, keep):
+    for entry in os.listdir(parent_dir):
+        if entry != keep:
+            shutil.rmtree(os.path.join(parent_dir, entry), ignore_errors=True)
+
+
+def ensure_profile_template(executable, template_dir, timeout=120):
+    """Makes sure there is an initialised LibreOffice profile in `template_dir`, and returns its path
+
+    LibreOffice populates an empty profile on its first start, which is a large
+    part of the cold start time. This is done once, by a LibreOffice that exits
+    right after initialising, and the result is copied for every new instance.
+    The template is kept in a subdirectory per LibreOffice installation, so an
+    upgraded LibreOffice gets a new one, and the old one is removed.
+    It's only an optimisation: if it can't be built, this returns None, and
+    LibreOffice starts from an empty profile.
+    """
+    with _template_lock:
+        parent_dir = template_dir
+        key = _executable_key(executable)
+        template_dir = os.path.join(parent_dir, key)
+        if os.path.isdir(os.path.join(template_dir, "user")):
+            return template_dir
+        if template_dir in _failed_templates:
+            return None
+
+        logger.info(f"Creating LibreOffice profile template in {template_dir}")
+        start = time.monotonic()
+        # Build it next to the final location, so a half-built template is never used
+        building_dir = f"{template_dir}.building"
+        shutil.rmtree(building_dir, ignore_errors=True)
+        cmd = [
+            executable,
+            "--headless",
+            "--invisible",
+            "--nocrashreport",
+            "--nodefault",
+            "--nologo",
+            "--nofirststartwizard",
+            "--norestore",
+            "--terminate_after_init",
+            f"-env:UserInstallation={Path(building_dir).as_uri()}",
+        ]
+        try:
+            os.makedirs(parent_dir, exist_ok=True)
+            subprocess.run(cmd, timeout=timeout, check=True)
+            shutil.rmtree(template_dir, ignore_errors=True)
+            os.replace(building_dir, template_dir)
+            _remove_other_templates(parent_dir, key)
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.warning(f"Could not create the LibreOffice profile template, starting from an empty profile: {e}")
+            _failed_templates.add(template_dir)
+            shutil.rmtree(building_dir, ignore_errors=True)
+            return None
+        logger.info(f"Created LibreOffice profile template in {time.monotonic() - start:.2f}s")
+        return template_dir
+
+
+def seed_user_installation(user_installation, template_dir):
+    """Copies the profile template into a user installation, unless it already has a profile"""
+    target = user_installation_path(user_installation)
+    if os.path.isdir(os.path.join(target, "user")):
+        return
+    shutil.copytree(template_dir, target, dirs_exist_ok=True)
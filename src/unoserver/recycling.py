@@ -0,0 +1,86 @@
+import time
+
+
+def memory_slope(samples):
+    """The growth of the memory use in bytes per second, by least squares
+
+    `samples` is a sequence of memory.MemorySample.
+    """
+    if len(samples) < 3:
+        return None
+    count = len(samples)
+    mean_time = sum(s.time for s in samples) / count
+    mean_bytes = sum(s.used for s in samples) / count
+    variance = sum((s.time - mean_time) ** 2 for s in samples)
+    if not variance:
+        return None
+    covariance = sum((s.time - mean_time) * (s.used - mean_bytes) for s in samples)
+    return covariance / variance
+
+
+class RecyclePolicy:
+    """Decides when a LibreOffice instance should be recycled before it gets slow
+
+    max_conversions: Recycle after this many conversions.
+
+    max_input_bytes: Recycle after this many bytes of input documents.
+
+    memory_trend_horizon: Recycle when the memory growth of the last samples predicts
+                          crossing the memory limit within this many seconds.
+
+    idle_after, idle_threshold: An instance that has been idle for `idle_after` seconds,
+                                and has used up `idle_threshold` of any of its limits, is
+                                recycled right away, instead of later in a busy moment.
+    """
+
+    def __init__(
+        self,
+        max_conversions=None,
+        max_input_bytes=None,
+        memory_trend_horizon=None,
+        idle_after=None,
+        idle_threshold=0.8,
+    ):
+        self.max_conversions = max_conversions
+        self.max_input_bytes = max_input_bytes
+        self.memory_trend_horizon = memory_trend_horizon
+        self.idle_after = idle_after
+        self.idle_threshold = idle_threshold
+
+    def check(self, server, now=None):
+        """Returns a (reason, details) tuple if the server should be recycled, or None"""
+        if now is None:
+            now = time.monotonic()
+
+        usage = {}
+        if self.max_conversions:
+            usage["conversions"] = server.conversions_since_start / self.max_conversions
+            if server.conversions_since_start >= self.max_conversions:
+                return "conversions", f"{server.conversions_since_start} conversions"
+        if self.max_input_bytes:
+            usage["input_bytes"] = server.input_bytes_since_start / self.max_input_bytes
+            if server.input_bytes_since_start >= self.max_input_bytes:
+                return "input_bytes", f"{server.input_bytes_since_start} bytes of input"
+
+        memory_limit = server.memory_usage_threshold
+        # Only the recent samples, old ones don't say much about the current growth
+        samples = list(server.memory_samples)[-12:]
+        if memory_limit and samples:
+            usage["memory"] = samples[-1].used / memory_limit
+
+        if self.memory_trend_horizon and memory_limit:
+            slope = memory_slope(samples)
+            if slope is not None and slope > 0:
+                seconds_left = (memory_limit - samples[-1].used) / slope
+                if seconds_left < self.memory_trend_horizon:
+                    return "memory_trend", (
+                        f"memory grows {int(slope / 1024)}kb/s, limit reached in {int(seconds_left)}s"
+                    )
+
+        if self.idle_after and usage and server.last_activity is not None and not server.is_busy:
+            idle_seconds = now - server.last_activity
+            name, fraction = max(usage.items(), key=lambda item: item[1])
+            if idle_seconds >= self.idle_after and fraction >= self.idle_threshold:
+                return "idle", f"idle for {int(idle_seconds)}s with {int(fraction * 100)}% of the {name} limit used"
+
+        return None
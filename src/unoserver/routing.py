@@ -0,0 +1,133 @@
+import logging
+import threading
+
+from unoserver import metrics
+from unoserver.classify import classify
+from unoserver.exceptions import UnoServerException
+
+logger = logging.getLogger("unoserver")
+
+
+class WorkerGroup:
+    """LibreOffice workers dedicated to some document classes
+
+    `backend` is an UnoServerPool with the group's own size, memory limit and
+    timeout, `admission_queue` bounds how many of its conversions wait.
+    """
+
+    def __init__(self, name, backend, classes=(), admission_queue=None):
+        self.name = name
+        self.backend = backend
+        self.classes = tuple(classes)
+        self.admission_queue = admission_queue
+
+
+class DocumentRouter:
+    """Sends every document to the worker group of its class
+
+    Each group has its own workers and queue, so documents that blow up memory or
+    take long, like large workbooks, only slow down the conversions of their own
+    class. Documents of a class without a group go to the `default` group.
+    """
+
+    def __init__(self, groups, default):
+        self.groups = {group.name: group for group in groups}
+        if default not in self.groups:
+            raise ValueError(f"There is no worker group called {default!r}")
+        self.default = self.groups[default]
+        self._groups_by_class = {}
+        for group in groups:
+            for document_class in group.classes:
+                if document_class in self._groups_by_class:
+                    raise ValueError(f"The {document_class} documents are routed to more than one group")
+                self._groups_by_class[document_class] = group
+
+    def group_for(self, file_content) -> WorkerGroup:
+        document_class = classify(file_content)
+        group = self._groups_by_class.get(document_class, self.default)
+        metrics.ROUTED_CONVERSIONS.inc(document_class=document_class or "unknown", group=group.name)
+        return group
+
+    def convert(self, file_content, **options) -> bytes:
+        group = self.group_for(file_content)
+        if group.admission_queue is None:
+            return group.backend.convert(file_content, **options)
+        with group.admission_queue.admit():
+            return group.backend.convert(file_content, **options)
+
+    def convert_many(self, file_content, targets, **options) -> list:
+        group = self.group_for(file_content)
+        if group.admission_queue is None:
+            return group.backend.convert_many(file_content, targets, **options)
+        with group.admission_queue.admit():
+            return group.backend.convert_many(file_content, targets, **options)
+
+    def convert_to_pdf(self, file_content: bytes) -> bytes:
+        return self.convert(file_content, convert_to="pdf")
+
+    def start(self, executable="libreoffice"):
+        errors = []
+
+        def start_group(group):
+            try:
+                group.backend.start(executable)
+            except Exception as e:
+                logger.exception(f"Could not start the {group.name} worker group")
+                errors.append(e)
+
+        threads = [threading.Thread(target=start_group, args=(group,)) for group in self.groups.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise UnoServerException("Could not start all worker groups, exiting.")
+
+    def shutdown(self):
+        for group in self.groups.values():
+            group.backend.shutdown()
+
+    def send_signal(self, signum):
+        for group in self.groups.values():
+            group.backend.send_signal(signum)
+
+    def signal_handler(self, signum, frame):
+        self.send_signal(signum)
+        exit()
+
+    @property
+    def libreoffice_version(self):
+        for group in self.groups.values():
+            if group.backend.libreoffice_version is not None:
+                return group.backend.libreoffice_version
+        return None
+
+    @property
+    def is_server_stopped(self):
+        return any(group.backend.is_server_stopped for group in self.groups.values())
+
+    @property
+    def is_ready(self):
+        # Every class of documents must have somewhere to go
+        return all(group.backend.is_ready for group in self.groups.values())
+
+    @property
+    def is_alive(self):
+        return all(group.backend.is_alive for group in self.groups.values())
+
+    def worker_status(self):
+        return [
+            {"group": group.name, **status}
+            for group in self.groups.values()
+            for status in group.backend.worker_status()
+        ]
+
+    def stats(self):
+        return {
+            group.name: {
+                "classes": list(group.classes),
+                "default": group is self.default,
+                "queue": group.admission_queue.stats() if group.admission_queue is not None else None,
+            }
+            for group in self.groups.values()
+        }
@@ -0,0 +1,225 @@
+import logging
+import os
+import time
+
+from unoserver import inputs, metrics
+from unoserver.cache import make_cache_key
+from unoserver.outputs import SpooledOutput
+from unoserver.singleflight import SingleFlight
+
+logger = logging.getLogger("unoserver")
+
+# Input types get their own metric labels, anything else is counted as "other",
+# so that odd file names can't blow up the number of time series.
+KNOWN_INPUT_TYPES = {
+    "doc", "docx", "docm", "dot", "dotx", "odt", "ott", "fodt", "rtf", "txt", "html", "htm", "xml",
+    "xls", "xlsx", "xlsm", "xlsb", "ods", "ots", "fods", "csv",
+    "ppt", "pptx", "pptm", "pps", "ppsx", "odp", "otp", "fodp",
+    "odg", "otg", "fodg", "vsd", "vsdx", "pdf", "svg", "png", "jpg", "jpeg",
+}
+
+
+def get_input_type(filename):
+    if not filename:
+        return "unknown"
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    if extension in KNOWN_INPUT_TYPES:
+        return extension
+    return "other"
+
+
+class ConversionService:
+    """The front of the conversion backend
+
+    Everything that should happen before a request reaches LibreOffice lives
+    here: the result cache, the coalescing of identical requests, and the
+    admission queue that bounds the number of waiting requests. Cache hits and
+    coalesced requests are answered without waiting in the queue.
+
+    Results are written to a SpooledOutput, which spills to a temporary file in
+    `spool_dir` above `spool_threshold` bytes. Only results that stayed in
+    memory are cached.
+
+    `max_queue_wait` is how long a conversion can wait for admission, by default
+    that of the admission queue. A coalesced request waits that much longer than
+    its own timeout, the conversion it waits for may have been queued first.
+    """
+
+    def __init__(
+        self,
+        backend,
+        cache=None,
+        admission_queue=None,
+        coalesce=True,
+        spool_threshold=8 * 1024 * 1024,
+        spool_dir=None,
+        max_queue_wait=None,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.admission_queue = admission_queue
+        self.single_flight = SingleFlight() if coalesce else None
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        if max_queue_wait is None and admission_queue is not None:
+            max_queue_wait = admission_queue.max_wait_time
+        self.max_queue_wait = max_queue_wait
+
+    def convert(
+        self,
+        file_content,
+        convert_to="pdf",
+        filtername=None,
+        filter_options=(),
+        update_index=True,
+        infiltername=None,
+        filename=None,
+        timeout=None,
+    ) -> bytes:
+        """Converts a document, given as bytes or as a seekable binary file
+
+        `timeout` is the deadline of the conversion in LibreOffice, in seconds.
+        `filename` is only used for the metrics.
+        """
+        output = self.convert_output(
+            file_content, convert_to, filtername, filter_options, update_index, infiltername, filename, timeout
+        )
+        return output.getvalue() if output is not None else None
+
+    def convert_output(
+        self,
+        file_content,
+        convert_to="pdf",
+        filtername=None,
+        filter_options=(),
+        update_index=True,
+        infiltername=None,
+        filename=None,
+        timeout=None,
+    ) -> SpooledOutput:
+        """Like convert(), but returns the result as a SpooledOutput
+
+        The result can then be streamed, or read as a file, without it ever
+        being in memory as a whole.
+        """
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            result, outcome = self._lookup_or_convert(
+                file_content, convert_to, filtername, filter_options, update_index, infiltername, timeout
+            )
+        finally:
+            metrics.CONVERSION_SECONDS.observe(
+                time.monotonic() - start, input_type=get_input_type(filename), outcome=outcome
+            )
+        metrics.INPUT_BYTES.inc(inputs.input_size(file_content))
+        if result is not None:
+            metrics.OUTPUT_BYTES.inc(result.size)
+        return result
+
+    def _lookup_or_convert(
+        self, file_content, convert_to, filtername, filter_options, update_index, infiltername, timeout
+    ):
+        options = {
+            "convert_to": convert_to,
+            "filtername": filtername,
+            "filter_options": tuple(filter_options),
+            "update_index": update_index,
+            "infiltername": infiltername,
+        }
+
+        if self.cache is None and self.single_flight is None:
+            return self._convert(None, file_content, options, timeout), "ok"
+
+        key = make_cache_key(
+            file_content,
+            libreoffice_version=self.backend.libreoffice_version,
+            **options,
+        )
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return SpooledOutput.from_bytes(result), "cached"
+
+        if self.single_flight is not None:
+            # Only requests with the same deadline are coalesced, so nobody waits longer
+            # than it asked for, or gets the timeout of a request with a shorter deadline
+            result = self.single_flight.do(
+                (key, timeout),
+                lambda: self._convert(key, file_content, options, timeout),
+                timeout=self._follower_timeout(timeout),
+            )
+        else:
+            result = self._convert(key, file_content, options, timeout)
+        return result, "ok" if result is not None else "error"
+
+    def _follower_timeout(self, timeout):
+        if timeout is None:
+            return None
+        return timeout + (self.max_queue_wait or 0)
+
+    def _convert(self, key, file_content, options, timeout):
+        output = SpooledOutput(threshold=self.spool_threshold, directory=self.spool_dir)
+        if self.admission_queue is not None:
+            with self.admission_queue.admit():
+                result = self.backend.convert(file_content, timeout=timeout, outfile=output, **options)
+        else:
+            result = self.backend.convert(file_content, timeout=timeout, outfile=output, **options)
+        if result is None:
+            return None
+
+        if self.cache is not None and not output.spilled:
+            self.cache.put(key, output.getvalue())
+        return output
+
+    def convert_many(
+        self, file_content, targets, update_index=True, infiltername=None, filename=None, timeout=None
+    ) -> list:
+        """Loads a document once in LibreOffice, and exports it once for each target
+
+        The targets are dicts with a convert_to, and optionally a filtername and
+        filter_options. Returns a SpooledOutput for each target, in order.
+        The results are neither cached nor coalesced, only admitted.
+        """
+        start = time.monotonic()
+        outcome = "error"
+        outputs = [SpooledOutput(threshold=self.spool_threshold, directory=self.spool_dir) for _ in targets]
+        targets = [
+            {
+                "convert_to": target.get("convert_to"),
+                "filtername": target.get("filtername"),
+                "filter_options": tuple(target.get("filter_options", ())),
+                "outfile": output,
+            }
+            for target, output in zip(targets, outputs)
+        ]
+        try:
+            if self.admission_queue is not None:
+                with self.admission_queue.admit():
+                    results = self.backend.convert_many(
+                        file_content, targets, update_index=update_index, infiltername=infiltername, timeout=timeout
+                    )
+            else:
+                results = self.backend.convert_many(
+                    file_content, targets, update_index=update_index, infiltername=infiltername, timeout=timeout
+                )
+            outcome = "ok"
+        finally:
+            metrics.CONVERSION_SECONDS.observe(
+                time.monotonic() - start, input_type=get_input_type(filename), outcome=outcome
+            )
+        metrics.INPUT_BYTES.inc(inputs.input_size(file_content))
+        for result in results:
+            if result is not None:
+                metrics.OUTPUT_BYTES.inc(result.size)
+        return results
+
+    def convert_to_pdf(self, file_content, filename=None, timeout=None, update_index=True) -> bytes:
+        return self.convert(
+            file_content, convert_to="pdf", update_index=update_index, filename=filename, timeout=timeout
+        )
+
+    def convert_to_pdf_output(self, file_content, filename=None, timeout=None, update_index=True) -> SpooledOutput:
+        return self.convert_output(
+            file_content, convert_to="pdf", update_index=update_index, filename=filename, timeout=timeout
+        )
@@ -0,0 +1,56 @@
+import threading
+
+from unoserver.exceptions import ConversionTimeoutException
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses identical concurrent calls into one
+
+    The first caller for a key runs the function, everybody that asks for the
+    same key while it runs waits for it, and gets the same result or the same
+    exception. A waiting caller gives up after its own `timeout`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, function, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise ConversionTimeoutException(f"The conversion took longer than {timeout}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self.coalesced}
@@ -0,0 +1,92 @@
+import io
+import threading
+
+import uno
+import unohelper
+
+from com.sun.star.io import XInputStream, XOutputStream, XSeekable
+
+from unoserver import inputs
+
+# Smaller documents are sent to LibreOffice in one piece, that's one round trip
+# instead of one per chunk, and the copy is small.
+SEQUENCE_LIMIT = 4 * 1024 * 1024
+
+
+class FileInputStream(unohelper.Base, XInputStream, XSeekable):
+    """An XInputStream that serves the reads of LibreOffice from a file, a chunk at a time
+
+    `fileobj` is any seekable binary file object, ie a temporary file, an
+    io.BytesIO or an mmap.mmap. Only the chunks LibreOffice asks for are copied,
+    so the memory used doesn't depend on the size of the document.
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._lock = threading.Lock()
+        self._length = inputs.input_size(fileobj)
+        self._file.seek(0)
+
+    def readBytes(self, data, count):
+        with self._lock:
+            chunk = self._file.read(count)
+        return len(chunk), uno.ByteSequence(chunk)
+
+    def readSomeBytes(self, data, count):
+        return self.readBytes(data, count)
+
+    def skipBytes(self, count):
+        with self._lock:
+            self._file.seek(count, 1)
+
+    def available(self):
+        with self._lock:
+            return max(0, self._length - self._file.tell())
+
+    def closeInput(self):
+        # The file belongs to the caller, and may be read again by a retry
+        pass
+
+    def seek(self, location):
+        with self._lock:
+            self._file.seek(location)
+
+    def getPosition(self):
+        with self._lock:
+            return self._file.tell()
+
+    def getLength(self):
+        return self._length
+
+
+class OutputStream(unohelper.Base, XOutputStream):
+    """An XOutputStream that hands every chunk LibreOffice writes to `sink`
+
+    The sink is any object with a write() method, ie a file, or an
+    outputs.SpooledOutput. Without one, the chunks are collected in `buffer`.
+    """
+
+    def __init__(self, sink=None):
+        self.buffer = io.BytesIO() if sink is None else None
+        self.sink = sink if sink is not None else self.buffer
+
+    def closeOutput(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def writeBytes(self, seq):
+        self.sink.write(seq.value)
+
+
+def make_input_stream(service, context, source):
+    """An XInputStream for a document given as bytes or as a seekable binary file"""
+    if inputs.is_file(source):
+        return FileInputStream(source)
+    if len(source) > SEQUENCE_LIMIT:
+        # io.BytesIO shares the buffer of the bytes, it doesn't copy them
+        return FileInputStream(io.BytesIO(source))
+    stream = service.createInstanceWithContext("com.sun.star.io.SequenceInputStream", context)
+    stream.initialize((uno.ByteSequence(source),))
+    return stream
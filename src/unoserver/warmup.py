@@ -0,0 +1,76 @@
+import logging
+import time
+
+logger = logging.getLogger("unoserver")
+
+# Tiny flat ODF documents, one for each document module. LibreOffice loads the
+# libraries, filter configuration and fonts of a module on first use, so
+# converting these once makes the first real conversion as fast as later ones.
+_NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+    'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0" '
+    'office:version="1.2"'
+)
+
+TEXT_SAMPLE = f"""<?xml version="1.0" encoding="UTF-8"?>
+<office:document {_NAMESPACES} office:mimetype="application/vnd.oasis.opendocument.text">
+ <office:body><office:text><text:h text:outline-level="1">Warm-up</text:h><text:p>Warm-up</text:p></office:text></office:body>
+</office:document>
+""".encode()
+
+SPREADSHEET_SAMPLE = f"""<?xml version="1.0" encoding="UTF-8"?>
+<office:document {_NAMESPACES} office:mimetype="application/vnd.oasis.opendocument.spreadsheet">
+ <office:body><office:spreadsheet><table:table table:name="Sheet1"><table:table-row>
+  <table:table-cell office:value-type="float" office:value="1"><text:p>1</text:p></table:table-cell>
+  <table:table-cell table:formula="of:=[.A1]+1" office:value-type="float" office:value="2">
+   <text:p>2</text:p>
+  </table:table-cell>
+ </table:table-row></table:table></office:spreadsheet></office:body>
+</office:document>
+""".encode()
+
+PRESENTATION_SAMPLE = f"""<?xml version="1.0" encoding="UTF-8"?>
+<office:document {_NAMESPACES} office:mimetype="application/vnd.oasis.opendocument.presentation">
+ <office:body><office:presentation><draw:page draw:name="page1">
+  <draw:frame svg:x="2cm" svg:y="2cm" svg:width="10cm" svg:height="2cm">
+   <draw:text-box><text:p>Warm-up</text:p></draw:text-box>
+  </draw:frame>
+ </draw:page></office:presentation></office:body>
+</office:document>
+""".encode()
+
+# The sample of each module, and the formats it's converted to
+SAMPLES = {
+    "text": (TEXT_SAMPLE, ("pdf", "docx")),
+    "spreadsheet": (SPREADSHEET_SAMPLE, ("pdf", "xlsx")),
+    "presentation": (PRESENTATION_SAMPLE, ("pdf", "pptx")),
+}
+
+
+def warm_up(converter_instance):
+    """Runs the samples through every module and export filter
+
+    Returns the seconds each conversion took, by "module/format". A failing
+    conversion is logged and skipped, a warm-up never stops LibreOffice from
+    being used.
+    """
+    timings = {}
+    start = time.monotonic()
+    converter_instance.get_available_import_filters()
+    converter_instance.get_available_export_filters()
+    converter_instance.get_filter_catalog()
+    timings["filters"] = time.monotonic() - start
+
+    for module, (sample, formats) in SAMPLES.items():
+        for convert_to in formats:
+            start = time.monotonic()
+            try:
+                converter_instance.convert(indata=sample, convert_to=convert_to)
+            except Exception:
+                logger.exception(f"Warming up the {module} module with a {convert_to} conversion failed")
+                continue
+            timings[f"{module}/{convert_to}"] = time.monotonic() - start
+    return timings